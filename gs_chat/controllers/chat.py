@@ -1,5 +1,6 @@
 import frappe
 from frappe import _
+import hashlib
 import json
 import re
 import time
@@ -7,7 +8,7 @@ import time
 from .layers.rag_retriever import SmartRAGRetriever
 from .layers.ai_provider import AIProviderConfig
 from .layers.template_renderer import render_template
-from .layers.conversation_manager import get_or_create_memory
+from .layers.conversation_manager import get_or_create_memory, append_to_memory_snapshot
 from .layers.sql_validator import validate_and_execute_query
 from .layers.system_prompt import SYSTEM_PROMPT
 
@@ -15,13 +16,44 @@ from pathlib import Path
 from langchain_openai import ChatOpenAI
 from langchain.chains import ConversationChain
 
-from langchain_core.messages import SystemMessage
+from langchain_core.messages import SystemMessage, HumanMessage
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder, SystemMessagePromptTemplate, HumanMessagePromptTemplate
 
-# Store conversation memories and settings cache
-conversation_memories = {}
+from collections import OrderedDict
+
+# Store conversation memories (LRU-ordered, bounded in conversation_manager)
+# and settings cache
+conversation_memories = OrderedDict()
 settings_cache = {"last_updated": None, "settings": None}
 
+# Cache RAG retrieval results for repeated queries (seconds)
+RAG_RESULT_CACHE_TTL = 600
+
+# Cap Error Log inserts during cascading failures
+ERROR_LOG_LIMIT = 10
+ERROR_LOG_WINDOW = 60
+
+
+def log_error_rate_limited(title, message=None):
+    """Log to Error Log unless the per-minute budget is already spent
+
+    Each frappe.log_error call is a full DocType insert; during a partial
+    outage (e.g. a DB blip) every chat request fails and the resulting
+    Error Log writes pile extra load onto the struggling database.
+    """
+    try:
+        cache = frappe.cache()
+        count = cache.incr("gs_chat_error_log_count")
+        if count == 1:
+            cache.expire("gs_chat_error_log_count", ERROR_LOG_WINDOW)
+        if count > ERROR_LOG_LIMIT:
+            return
+    except Exception:
+        # Cache unavailable - fall through and log anyway
+        pass
+
+    frappe.log_error(title, message)
+
 
 def get_cached_settings():
     """Get cached chatbot settings to avoid repeated database calls"""
@@ -111,6 +143,7 @@ def process_message(query, references=None, conversation_id=None):
             "is_error": 0
         })
         user_message.insert(ignore_permissions=True)
+        append_to_memory_snapshot(conversation_id, "user", query)
 
         # Get or create memory for this conversation
         memory = get_or_create_memory(conversation_id, conversation_memories, api_key, provider, base_url)
@@ -118,9 +151,23 @@ def process_message(query, references=None, conversation_id=None):
         # RAG: Retrieve relevant documents (replaces SchemaLayer)
         relevant_docs = []
         try:
-            rag_retriever = SmartRAGRetriever(api_key, provider, base_url)
-            relevant_docs = rag_retriever.get_relevant_documents(query, top_k=5)
-            frappe.logger().info(f"RAG retrieved {len(relevant_docs)} documents")
+            # Repeated queries skip the embedding call and FAISS search
+            query_hash = hashlib.blake2b(query.encode(), digest_size=16).hexdigest()
+            rag_cache_key = f"gs_chat_rag_results:{provider}:{query_hash}:5"
+            cached_docs = frappe.cache().get_value(rag_cache_key)
+
+            if cached_docs is not None:
+                relevant_docs = json.loads(cached_docs)
+                frappe.logger().info(f"RAG cache hit: {len(relevant_docs)} documents")
+            else:
+                rag_retriever = SmartRAGRetriever(api_key, provider, base_url)
+                relevant_docs = rag_retriever.get_relevant_documents(query, top_k=5)
+                frappe.cache().set_value(
+                    rag_cache_key,
+                    json.dumps(relevant_docs, default=str),
+                    expires_in_sec=RAG_RESULT_CACHE_TTL
+                )
+                frappe.logger().info(f"RAG retrieved {len(relevant_docs)} documents")
         except Exception as e:
             frappe.log_error(f"RAG initialization/retrieval failed", str(e))
             # Continue without RAG - system will work with basic prompt only
@@ -237,6 +284,7 @@ def process_message(query, references=None, conversation_id=None):
             "is_error": 0
         })
         bot_message.insert(ignore_permissions=True)
+        append_to_memory_snapshot(conversation_id, "bot", response)
 
         return {
             "success": True,
@@ -249,8 +297,130 @@ def process_message(query, references=None, conversation_id=None):
             "rag_used": len(relevant_docs) > 0
         }
 
+    except (frappe.DoesNotExistError, frappe.PermissionError, frappe.ValidationError) as e:
+        # User-driven failures don't warrant an Error Log insert
+        return {
+            "success": False,
+            "error": str(e)
+        }
     except Exception as e:
-        frappe.log_error("Chatbot Error", str(e))
+        log_error_rate_limited("Chatbot Error", str(e))
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+# Upper bin boundaries in estimated tokens; a mixed-length batch makes
+# the provider wait on its longest item, so prompts are grouped into
+# similar-length bins and each bin dispatched as its own batch
+BATCH_LENGTH_BINS = (64, 256, 1024)
+
+
+def _length_bin(estimated_tokens):
+    for index, bound in enumerate(BATCH_LENGTH_BINS):
+        if estimated_tokens < bound:
+            return index
+    return len(BATCH_LENGTH_BINS)
+
+
+def _build_rag_context(relevant_docs):
+    """Format retrieved documents into the system-prompt context block"""
+    if not relevant_docs:
+        return ""
+
+    parts = ["\n\n📚 RELEVANT KNOWLEDGE BASE:\n"]
+    for i, doc in enumerate(relevant_docs, 1):
+        escaped_content = doc['content'].replace('{', '{{').replace('}', '}}')
+        parts.append(f"\n{i}. Source: {doc['source']}\nContent: {escaped_content}...\n")
+    return "".join(parts)
+
+
+@frappe.whitelist()
+def process_messages(messages):
+    """Answer a batch of stateless messages in one pass
+
+    Evaluation and grading runs submit many independent questions;
+    routing each through process_message repeats the settings load,
+    RAG retrieval and a serial LLM round-trip per question. This
+    entrypoint loads settings and the retriever once and sends all
+    prompts through batched llm calls. Unlike process_message it keeps
+    no conversation or memory state and persists nothing.
+    """
+    try:
+        if isinstance(messages, str):
+            messages = json.loads(messages)
+
+        if not messages:
+            return {
+                "success": False,
+                "error": "No messages provided"
+            }
+
+        settings = get_cached_settings()
+        api_key = settings.get("api_key")
+        provider = settings.get("provider") or "OpenAI"
+
+        default_model = AIProviderConfig.get_default_model(provider)
+        model_name = settings.get("model") or default_model
+        base_url = settings.get("base_url") if provider == "DeepSeek" else None
+
+        is_valid, error_msg = AIProviderConfig.validate_provider_config(provider, api_key, base_url)
+        if not is_valid:
+            return {
+                "success": False,
+                "error": error_msg
+            }
+
+        # Retrieval stays on the request thread: searches resolve site
+        # paths through frappe.local and a cold cache rebuilds the index
+        # from the database, neither of which is available in pool
+        # workers. The knowledge base still loads only once for the
+        # whole batch, and the LLM round-trips below remain batched.
+        retriever = SmartRAGRetriever(api_key, provider, base_url)
+        docs_per_message = [
+            retriever.get_relevant_documents(query, top_k=5)
+            for query in messages
+        ]
+
+        llm_kwargs = AIProviderConfig.get_llm_config(provider, api_key, model_name, base_url)
+        llm = ChatOpenAI(**llm_kwargs)
+
+        prompts = [
+            [
+                SystemMessage(content=SYSTEM_PROMPT + _build_rag_context(relevant_docs)),
+                HumanMessage(content=f"Generate a response for: {query}")
+            ]
+            for query, relevant_docs in zip(messages, docs_per_message)
+        ]
+
+        # Bin prompts by estimated length (question plus retrieved
+        # context, word count as the token proxy) and dispatch each bin
+        # separately, so short questions don't wait on long outliers
+        bins = {}
+        for index, (query, relevant_docs) in enumerate(zip(messages, docs_per_message)):
+            estimated_tokens = len(query.split()) + sum(
+                len(doc['content'].split()) for doc in relevant_docs
+            )
+            bins.setdefault(_length_bin(estimated_tokens), []).append(index)
+
+        # Each bin's responses come back in submission order, so the
+        # stored indices restore the original input order
+        responses = [None] * len(prompts)
+        for indexes in bins.values():
+            bin_responses = llm.batch([prompts[i] for i in indexes])
+            for index, response in zip(indexes, bin_responses):
+                responses[index] = response
+
+        return {
+            "success": True,
+            "responses": [response.content for response in responses],
+            "provider": provider,
+            "model": model_name
+        }
+
+    except Exception as e:
+        log_error_rate_limited("Chatbot Batch Error", str(e))
         return {
             "success": False,
             "error": str(e)
@@ -282,7 +452,7 @@ def log_interaction(query, response, has_context):
         })
         doc.insert(ignore_permissions=True)
     except Exception as e:
-        frappe.log_error(f"Failed to log chatbot interaction", str(e))
+        log_error_rate_limited(f"Failed to log chatbot interaction", str(e))
 
 @frappe.whitelist()
 def get_conversations():
@@ -305,7 +475,7 @@ def get_conversations():
             "conversations": conversations
         }
     except Exception as e:
-        frappe.log_error(f"Failed to get conversations", str(e))
+        log_error_rate_limited(f"Failed to get conversations", str(e))
         return {
             "success": False,
             "error": str(e)
@@ -332,7 +502,7 @@ def create_conversation():
             "conversation_id": conversation.name
         }
     except Exception as e:
-        frappe.log_error(f"Failed to create conversation", str(e))
+        log_error_rate_limited(f"Failed to create conversation", str(e))
         return {
             "success": False,
             "error": str(e)
@@ -363,8 +533,14 @@ def get_conversation_messages(conversation_id):
             "success": True,
             "messages": messages
         }
+    except (frappe.DoesNotExistError, frappe.PermissionError, frappe.ValidationError) as e:
+        # User-driven failures don't warrant an Error Log insert
+        return {
+            "success": False,
+            "error": str(e)
+        }
     except Exception as e:
-        frappe.log_error(f"Failed to get conversation messages", str(e))
+        log_error_rate_limited(f"Failed to get conversation messages", str(e))
         return {
             "success": False,
             "error": str(e)
@@ -386,23 +562,14 @@ def get_available_models(provider=None):
                 "default_model": default_model
             }
         else:
-            # Get models for all providers
-            all_models = {}
-            providers = ["OpenAI", "DeepSeek"]
-
-            for prov in providers:
-                all_models[prov] = {
-                    "models": AIProviderConfig.get_available_models(prov),
-                    "default_model": AIProviderConfig.get_default_model(prov)
-                }
-
+            # Get models for all providers in a single pass
             return {
                 "success": True,
-                "providers": all_models
+                "providers": AIProviderConfig.get_all_providers()
             }
 
     except Exception as e:
-        frappe.log_error(f"Failed to get available models", str(e))
+        log_error_rate_limited(f"Failed to get available models", str(e))
         return {
             "success": False,
             "error": str(e)
@@ -429,6 +596,7 @@ def save_message(conversation_id, message_type, content, is_error=0):
         })
 
         message.insert(ignore_permissions=True)
+        append_to_memory_snapshot(conversation_id, message_type, content, is_error)
 
         # Update conversation title if this is the first user message
         if message_type == 'user':
@@ -441,17 +609,29 @@ def save_message(conversation_id, message_type, content, is_error=0):
             )
 
             if message_count <= 1:
-                # Use the first 30 characters as the title
+                # Use the first 30 characters as the title. Plain row update -
+                # a title refresh doesn't need ORM hydration or controller hooks
                 title = content[:30] + ("..." if len(content) > 30 else "")
-                conversation.title = title
-                conversation.save(ignore_permissions=True)
+                frappe.db.sql(
+                    """UPDATE `tabChatbot Conversation`
+                    SET title=%s, modified=NOW(), modified_by=%s
+                    WHERE name=%s""",
+                    (title, user, conversation_id)
+                )
+                frappe.clear_document_cache("Chatbot Conversation", conversation_id)
 
         return {
             "success": True,
             "message_id": message.name
         }
+    except (frappe.DoesNotExistError, frappe.PermissionError, frappe.ValidationError) as e:
+        # User-driven failures don't warrant an Error Log insert
+        return {
+            "success": False,
+            "error": str(e)
+        }
     except Exception as e:
-        frappe.log_error(f"Failed to save message", str(e))
+        log_error_rate_limited(f"Failed to save message", str(e))
         return {
             "success": False,
             "error": str(e)
@@ -16,6 +16,11 @@ class EntitySelector:
         self.cache = {}
         # Load allowed doctypes from settings
         self.allowed_doctypes = self._get_allowed_doctypes()
+        # Prebuilt sorted suggestions so each lookup is a plain filter pass
+        self._sorted_suggestions = tuple(
+            {"label": doctype, "value": doctype}
+            for doctype in sorted(self.allowed_doctypes)
+        )
 
     def _get_allowed_doctypes(self) -> Dict[str, List[str]]:
         """Get doctypes and fields allowed for chatbot access"""
@@ -61,16 +66,14 @@ class EntitySelector:
         Returns:
             List of matching doctypes with labels and values
         """
-        suggestions = []
-        
-        for doctype in self.allowed_doctypes:
-            if not partial_input or partial_input.lower() in doctype.lower():
-                suggestions.append({
-                    "label": doctype,
-                    "value": doctype
-                })
-        
-        return sorted(suggestions, key=lambda x: x["label"])
+        if not partial_input:
+            return list(self._sorted_suggestions)
+
+        partial_lower = partial_input.lower()
+        return [
+            suggestion for suggestion in self._sorted_suggestions
+            if partial_lower in suggestion["label"].lower()
+        ]
     
     def get_document_suggestions(self, doctype: str, partial_input: str = "", limit: int = 200) -> List[Dict[str, str]]:
         """
@@ -137,32 +140,41 @@ class EntitySelector:
             frappe.log_error(f"Error getting document suggestions for {doctype}: {str(e)}")
             return []
 
+# Shared instance so the allowed-doctype query runs once per worker,
+# not on every keystroke of the slash-command UI
+_entity_selector = None
+
+def _get_entity_selector():
+    """Get or create the module-level EntitySelector instance"""
+    global _entity_selector
+    if _entity_selector is None:
+        _entity_selector = EntitySelector()
+    return _entity_selector
+
 # API endpoints for slash command system
 @frappe.whitelist()
 def get_doctype_suggestions(partial_input=""):
     """
     Get suggestions for doctypes based on partial input.
-    
+
     Args:
         partial_input: Partial doctype name
-        
+
     Returns:
         List of matching doctypes with labels and values
     """
-    entity = EntitySelector()
-    return entity.get_doctype_suggestions(partial_input)
+    return _get_entity_selector().get_doctype_suggestions(partial_input)
 
 @frappe.whitelist()
 def get_document_suggestions(doctype, partial_input=""):
     """
     Get suggestions for documents of a specific doctype based on partial input.
-    
+
     Args:
         doctype: Doctype to search in
         partial_input: Partial document name or search term
-        
+
     Returns:
         List of matching documents with labels and values
     """
-    entity = EntitySelector()
-    return entity.get_document_suggestions(doctype, partial_input)
\ No newline at end of file
+    return _get_entity_selector().get_document_suggestions(doctype, partial_input)
\ No newline at end of file
@@ -2,16 +2,46 @@
 
 import frappe
 import re
+import sys
 from .base import BaseIndustry
 
 class NBFCIndustry(BaseIndustry):
     """NBFC-specific implementation for chatbot"""
 
+    # Loan ID patterns (customize based on your format), compiled once at
+    # class load instead of per preprocess_query call
+    LOAN_ID_RE = re.compile(
+        r'(LOAN-\d+)|(LN\d+)|(ACC-\d+)|(LAP-\d+)|(\d{10,12})',
+        re.IGNORECASE
+    )
+
     def __init__(self):
         super().__init__()
         self.industry_name = "NBFC"
         self.priority_doctypes = self.get_priority_doctypes()
-        self.search_synonyms = self.get_search_synonyms()
+        # Normalize and intern the synonym keys once so hot-path dict
+        # lookups resolve by pointer equality instead of re-hashing
+        self.search_synonyms = {
+            sys.intern(term.lower()): synonyms
+            for term, synonyms in self.get_search_synonyms().items()
+        }
+        # Token-set structures so synonym matching is one set intersection
+        # instead of a per-term substring scan over the query
+        self._token_re = re.compile(r'\w+')
+        self._single_token_terms = frozenset(
+            term for term in self.search_synonyms
+            if self._token_re.fullmatch(term)
+        )
+        multi_token_terms = tuple(
+            term for term in self.search_synonyms
+            if term not in self._single_token_terms
+        )
+        # One alternation scan over the query replaces a per-term
+        # substring search for the hyphenated/multi-word terms
+        self._multi_token_re = (
+            re.compile("|".join(re.escape(term) for term in multi_token_terms))
+            if multi_token_terms else None
+        )
 
     def get_priority_doctypes(self):
         """Return NBFC-specific priority doctypes"""
@@ -71,24 +101,17 @@ class NBFCIndustry(BaseIndustry):
         enhanced_query = query
         query_lower = query.lower()
 
-        # Add synonyms
-        for term, synonyms in self.search_synonyms.items():
-            if term in query_lower:
-                enhanced_query += f" {' '.join(synonyms)}"
-
-        # Detect loan ID patterns (customize based on your format)
-        loan_patterns = [
-            r'(LOAN-\d+)',
-            r'(LN\d+)',
-            r'(ACC-\d+)',
-            r'(LAP-\d+)',  # Loan application
-            r'(\d{10,12})'  # Account numbers
-        ]
+        # Add synonyms - single-word terms match via set intersection in C,
+        # multi-word terms via one compiled alternation scan
+        matched_terms = set(self._token_re.findall(query_lower)) & self._single_token_terms
+        if self._multi_token_re:
+            matched_terms.update(self._multi_token_re.findall(query_lower))
+        for term in matched_terms:
+            enhanced_query += f" {' '.join(self.search_synonyms[term])}"
 
-        for pattern in loan_patterns:
-            if re.search(pattern, query, re.IGNORECASE):
-                enhanced_query += " loan_id account_number loan_account loan_reference"
-                break
+        # Detect loan ID / account number patterns
+        if self.LOAN_ID_RE.search(query):
+            enhanced_query += " loan_id account_number loan_account loan_reference"
 
         # Detect date-related queries
         date_keywords = ["today", "yesterday", "this month", "last month", "this week",
@@ -107,6 +130,14 @@ class NBFCIndustry(BaseIndustry):
         """Calculate NBFC-specific metrics"""
         metrics = {}
 
+        # Bind dates once so MySQL reuses cached plans instead of
+        # re-evaluating CURDATE() per call (and per row in the CASE below)
+        today = frappe.utils.today()
+        query_params = {
+            "today": today,
+            "npa_cutoff": frappe.utils.add_days(today, -90)
+        }
+
         try:
             # Portfolio metrics
             metrics["portfolio_outstanding"] = frappe.db.sql("""
@@ -124,8 +155,8 @@ class NBFCIndustry(BaseIndustry):
                     COALESCE(SUM(CASE WHEN paid = 1 THEN total_payment ELSE 0 END), 0) as collected,
                     COALESCE(SUM(total_payment), 0) as total_due
                 FROM `tabLoan Repayment Schedule`
-                WHERE payment_date <= CURDATE() AND docstatus = 1
-            """, as_dict=True)[0]
+                WHERE payment_date <= %(today)s AND docstatus = 1
+            """, query_params, as_dict=True)[0]
 
             if metrics["collection_efficiency"]["total_due"] > 0:
                 metrics["collection_efficiency"]["efficiency_percent"] = (
@@ -137,10 +168,10 @@ class NBFCIndustry(BaseIndustry):
             metrics["dpd_buckets"] = frappe.db.sql("""
                 SELECT
                     CASE
-                        WHEN DATEDIFF(CURDATE(), payment_date) = 0 THEN 'Current'
-                        WHEN DATEDIFF(CURDATE(), payment_date) BETWEEN 1 AND 30 THEN 'DPD 1-30'
-                        WHEN DATEDIFF(CURDATE(), payment_date) BETWEEN 31 AND 60 THEN 'DPD 31-60'
-                        WHEN DATEDIFF(CURDATE(), payment_date) BETWEEN 61 AND 90 THEN 'DPD 61-90'
+                        WHEN DATEDIFF(%(today)s, payment_date) = 0 THEN 'Current'
+                        WHEN DATEDIFF(%(today)s, payment_date) BETWEEN 1 AND 30 THEN 'DPD 1-30'
+                        WHEN DATEDIFF(%(today)s, payment_date) BETWEEN 31 AND 60 THEN 'DPD 31-60'
+                        WHEN DATEDIFF(%(today)s, payment_date) BETWEEN 61 AND 90 THEN 'DPD 61-90'
                         ELSE 'DPD 90+'
                     END as bucket,
                     COUNT(DISTINCT loan) as loan_count,
@@ -148,7 +179,7 @@ class NBFCIndustry(BaseIndustry):
                 FROM `tabLoan Repayment Schedule`
                 WHERE paid = 0 AND docstatus = 1
                 GROUP BY bucket
-            """, as_dict=True)
+            """, query_params, as_dict=True)
 
             # NPA Statistics
             metrics["npa_stats"] = frappe.db.sql("""
@@ -156,9 +187,9 @@ class NBFCIndustry(BaseIndustry):
                     COUNT(DISTINCT loan) as npa_accounts,
                     COALESCE(SUM(total_payment), 0) as npa_amount
                 FROM `tabLoan Repayment Schedule`
-                WHERE payment_date < DATE_SUB(CURDATE(), INTERVAL 90 DAY)
+                WHERE payment_date < %(npa_cutoff)s
                 AND paid = 0 AND docstatus = 1
-            """, as_dict=True)[0]
+            """, query_params, as_dict=True)[0]
 
             # Today's business
             metrics["todays_business"] = frappe.db.sql("""
@@ -168,10 +199,10 @@ class NBFCIndustry(BaseIndustry):
                     COUNT(DISTINCT ld.loan) as loans_disbursed,
                     COUNT(DISTINCT lr.loan) as loans_collected
                 FROM `tabLoan Disbursement` ld
-                LEFT JOIN `tabLoan Repayment` lr ON DATE(lr.posting_date) = CURDATE()
-                WHERE DATE(ld.disbursement_date) = CURDATE()
+                LEFT JOIN `tabLoan Repayment` lr ON DATE(lr.posting_date) = %(today)s
+                WHERE DATE(ld.disbursement_date) = %(today)s
                 AND ld.docstatus = 1
-            """, as_dict=True)[0]
+            """, query_params, as_dict=True)[0]
 
         except Exception as e:
             frappe.log_error(f"Error calculating NBFC metrics: {str(e)}", "NBFC Metrics")
@@ -1,3 +1,16 @@
+# Single source of truth for provider models and defaults
+_PROVIDER_DEFAULTS = {
+    "OpenAI": {
+        "default": "gpt-3.5-turbo",
+        "models": ["gpt-4", "gpt-3.5-turbo", "gpt-4-turbo"]
+    },
+    "DeepSeek": {
+        "default": "deepseek-chat",
+        "models": ["deepseek-chat", "deepseek-reasoner"]
+    }
+}
+
+
 class AIProviderConfig:
     """Factory class for AI provider configurations"""
 
@@ -29,18 +42,7 @@ class AIProviderConfig:
         Returns:
             str: Default model name for the provider
         """
-        defaults = {
-            "OpenAI": {
-                "default": "gpt-3.5-turbo",
-                "models": ["gpt-4", "gpt-3.5-turbo", "gpt-4-turbo"]
-            },
-            "DeepSeek": {
-                "default": "deepseek-chat",
-                "models": ["deepseek-chat", "deepseek-reasoner"]
-            }
-        }
-
-        provider_config = defaults.get(provider, defaults["OpenAI"])
+        provider_config = _PROVIDER_DEFAULTS.get(provider, _PROVIDER_DEFAULTS["OpenAI"])
         return provider_config["default"]
 
     @staticmethod
@@ -54,20 +56,25 @@ class AIProviderConfig:
         Returns:
             list: List of available models for the provider
         """
-        defaults = {
-            "OpenAI": {
-                "default": "gpt-3.5-turbo",
-                "models": ["gpt-4", "gpt-3.5-turbo", "gpt-4-turbo"]
-            },
-            "DeepSeek": {
-                "default": "deepseek-chat",
-                "models": ["deepseek-chat", "deepseek-reasoner"]
+        provider_config = _PROVIDER_DEFAULTS.get(provider, _PROVIDER_DEFAULTS["OpenAI"])
+        return provider_config["models"]
+
+    @staticmethod
+    def get_all_providers():
+        """
+        Get models and default model for all providers in a single pass
+
+        Returns:
+            dict: Provider name mapped to its models and default model
+        """
+        return {
+            provider: {
+                "models": config["models"],
+                "default_model": config["default"]
             }
+            for provider, config in _PROVIDER_DEFAULTS.items()
         }
 
-        provider_config = defaults.get(provider, defaults["OpenAI"])
-        return provider_config["models"]
-
     @staticmethod
     def is_valid_model(provider, model):
         """
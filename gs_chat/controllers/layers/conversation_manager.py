@@ -1,43 +1,140 @@
 
+import functools
+import pickle
+
 import frappe
 from langchain.memory import ConversationTokenBufferMemory
+from langchain_core.messages import AIMessage, HumanMessage
 from .ai_provider import AIProviderConfig
 from langchain_openai import ChatOpenAI
 
+# Cap on cached conversation memories per worker - each entry pins a token
+# buffer plus an LLM client, so an unbounded dict slowly leaks RAM in
+# long-lived workers
+MEMORY_CACHE_MAX = 256
+
+# How long a serialized message snapshot survives in Redis; one hour covers
+# the typical worker restart window without keeping dead conversations around
+MEMORY_SNAPSHOT_TTL = 3600
+
+# Mirror of the SQL rehydration limit so snapshot and query agree
+MEMORY_SNAPSHOT_MESSAGES = 10
+
+
+def _memory_snapshot_key(conversation_id):
+    return f"chatmem:{conversation_id}"
+
+
+def invalidate_memory_snapshot(conversation_id):
+    """Drop the cached message snapshot for a conversation"""
+    frappe.cache().delete_value(_memory_snapshot_key(conversation_id))
+
+
+def append_to_memory_snapshot(conversation_id, message_type, content, is_error=0):
+    """Append a just-saved message to the Redis snapshot in place
+
+    Deleting the snapshot on every insert meant the next rehydrate
+    always fell back to the SQL query; updating it keeps the snapshot
+    warm so cold workers actually hit Redis. Error messages are
+    excluded, matching the is_error=0 filter the SQL rehydration uses,
+    and a missing snapshot stays missing - the next rehydrate rebuilds
+    and re-seeds it.
+    """
+    if is_error or message_type not in ("user", "bot"):
+        return
+
+    cache = frappe.cache()
+    snapshot_key = _memory_snapshot_key(conversation_id)
+    snapshot = cache.get_value(snapshot_key)
+    if snapshot is None:
+        return
+
+    try:
+        messages = pickle.loads(snapshot)
+    except Exception:
+        # Corrupt snapshot - drop it and let the next rehydrate rebuild
+        invalidate_memory_snapshot(conversation_id)
+        return
+
+    messages.append(
+        HumanMessage(content=content) if message_type == "user"
+        else AIMessage(content=content)
+    )
+    cache.set_value(
+        snapshot_key,
+        pickle.dumps(messages[-MEMORY_SNAPSHOT_MESSAGES:]),
+        expires_in_sec=MEMORY_SNAPSHOT_TTL
+    )
+
+
+@functools.lru_cache(maxsize=32)
+def _get_memory_llm(provider, api_key, base_url):
+    """Shared ChatOpenAI client per provider configuration
+
+    Each ChatOpenAI builds its own HTTP client and connection pool;
+    reusing one per (provider, api_key, base_url) keeps connections warm
+    across conversations instead of re-handshaking per new conversation.
+    """
+    memory_llm_kwargs = AIProviderConfig.get_llm_config(
+        provider, api_key, AIProviderConfig.get_default_model(provider), base_url
+    )
+    memory_llm_kwargs["temperature"] = 0  # Override temperature for memory
+    return ChatOpenAI(**memory_llm_kwargs)
+
+
 def get_or_create_memory(conversation_id, conversation_memories, api_key, provider="OpenAI", base_url=None):
-    if conversation_id not in conversation_memories:
-        # Create LLM instance for memory using configuration factory
-        memory_llm_kwargs = AIProviderConfig.get_llm_config(provider, api_key,
-                                                           AIProviderConfig.get_default_model(provider),
-                                                           base_url)
-        memory_llm_kwargs["temperature"] = 0  # Override temperature for memory
-
-        # Use a token-aware memory implementation
+    if conversation_id in conversation_memories:
+        # Refresh LRU position on hit
+        conversation_memories.move_to_end(conversation_id)
+    else:
+        # Use a token-aware memory implementation with a shared LLM client
         memory = ConversationTokenBufferMemory(
-            llm=ChatOpenAI(**memory_llm_kwargs),
+            llm=_get_memory_llm(provider, api_key, base_url),
             max_token_limit=3000,
             return_messages=True
         )
 
-        # Load recent messages from database (limit to last 10)
-        messages = frappe.get_all(
-            "Chatbot Message",
-            fields=["message_type", "content"],
-            filters={
-                "conversation": conversation_id,
-                "is_error": 0
-            },
-            order_by="creation desc",
-            limit=10
-        )
+        # After a worker restart the history may already be sitting in
+        # Redis; rehydrating from the snapshot skips the SQL query and
+        # per-message object construction entirely
+        snapshot_key = _memory_snapshot_key(conversation_id)
+        snapshot = frappe.cache().get_value(snapshot_key)
+
+        if snapshot is not None:
+            memory.chat_memory.messages = pickle.loads(snapshot)
+        else:
+            # Load recent messages from database (limit to last 10); the
+            # (conversation, creation) index keeps this a single index scan
+            messages = frappe.get_all(
+                "Chatbot Message",
+                fields=["message_type", "content"],
+                filters={
+                    "conversation": conversation_id,
+                    "is_error": 0
+                },
+                order_by="creation desc",
+                limit=10
+            )
 
-        # Add messages in reverse order (oldest first)
-        for msg in reversed(messages):
-            if msg.message_type == "user":
-                memory.chat_memory.add_user_message(msg.content)
-            elif msg.message_type == "bot":
-                memory.chat_memory.add_ai_message(msg.content)
+            # Build the message list in one pass (oldest first) and assign in
+            # bulk instead of going through per-message add_* calls
+            memory.chat_memory.messages = [
+                HumanMessage(content=msg.content) if msg.message_type == "user"
+                else AIMessage(content=msg.content)
+                for msg in reversed(messages)
+                if msg.message_type in ("user", "bot")
+            ]
+
+            frappe.cache().set_value(
+                snapshot_key,
+                pickle.dumps(memory.chat_memory.messages),
+                expires_in_sec=MEMORY_SNAPSHOT_TTL
+            )
 
         conversation_memories[conversation_id] = memory
 
+        # Evict the least recently used conversation once over the cap
+        if len(conversation_memories) > MEMORY_CACHE_MAX:
+            conversation_memories.popitem(last=False)
+
     return conversation_memories[conversation_id]
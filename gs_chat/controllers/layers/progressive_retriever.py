@@ -1,6 +1,12 @@
 # gs_chat/controllers/layers/progressive_retriever.py
 
+import asyncio
+import functools
+import hashlib
 import json
+import re
+import threading
+import time
 import frappe
 from frappe import _
 from .rag_retriever import SmartRAGRetriever
@@ -9,18 +15,140 @@ from .ai_provider import AIProviderConfig
 from .system_prompt import HOW_TO, DB_QUERY, RESPONSE_FORMAT, FEATURES, SQL_SAFETY_RULES
 from langchain_openai import ChatOpenAI
 
+try:
+    import sqlglot
+    from sqlglot import exp as sqlglot_exp
+except ImportError:
+    sqlglot = None
+
+# Concurrency bounds so parallel calls don't swamp the embedding
+# provider or trip LLM rate limits
+RAG_SEARCH_CONCURRENCY = 8
+LLM_CONCURRENCY = 16
+LLM_BUCKET_CAPACITY = 30
+LLM_BUCKET_REFILL_PER_SEC = 0.5
+
+# First-pass analysis cache - the analysis LLM call is near-deterministic at
+# low temperature, so repeat queries with the same recent context can reuse
+# the parsed result instead of paying another LLM roundtrip
+ANALYSIS_CACHE_TTL = 600
+ANALYSIS_CACHE_MAX_ENTRIES = 1024
+_analysis_cache = {}
+
+# RAG search cache - repeated phrasings within a session skip the
+# embedding call and vector search
+RAG_CACHE_TTL = 600
+RAG_CACHE_MAX_ENTRIES = 2048
+_rag_result_cache = {}
+
+# Single word-boundary scan instead of upper() plus one substring pass per
+# keyword; \b also stops false positives like a column named updated_on
+_UNSAFE_SQL_RE = re.compile(
+    r'\b(DELETE|DROP|TRUNCATE|ALTER|UPDATE|GRANT|REVOKE)\b',
+    re.IGNORECASE
+)
+
+# Expression nodes that must never appear in a first-pass query; resolved by
+# name so the tuple works across sqlglot versions
+_FORBIDDEN_SQL_NODES = tuple(
+    node for node in (
+        getattr(sqlglot_exp, name, None)
+        for name in ("Update", "Delete", "Drop", "Alter", "AlterTable",
+                     "TruncateTable", "Grant", "Command")
+    )
+    if node is not None
+) if sqlglot else ()
+
+
+@functools.lru_cache(maxsize=512)
+def _serialize_meta(doctype, meta_version):
+    """Build the per-doctype schema dict, cached per (doctype, modified)
+
+    get_meta is cached by Frappe, but re-serializing every field into
+    dicts per request isn't; keying on the meta's modified timestamp keeps
+    the cache correct across schema changes.
+    """
+    meta = frappe.get_meta(doctype)
+    schema_info = {
+        "doctype": doctype,
+        "module": meta.module,
+        "is_submittable": meta.is_submittable,
+        "fields": []
+    }
+
+    for field in meta.fields:
+        schema_info["fields"].append({
+            "fieldname": field.fieldname,
+            "fieldtype": field.fieldtype,
+            "label": field.label,
+            "options": field.options,
+            "reqd": field.reqd,
+            "hidden": field.hidden
+        })
+
+    return schema_info
+
+
+class TokenBucket:
+    """Thread-safe token bucket used to pace LLM calls"""
+
+    def __init__(self, capacity, refill_rate):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Block until the requested tokens are available"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self._last_refill) * self.refill_rate
+                )
+                self._last_refill = now
+
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+
+                wait = (tokens - self.tokens) / self.refill_rate
+
+            time.sleep(wait)
+
+
 class ProgressiveRetriever:
     """Progressive data fetching with LLM-driven decisions"""
-    
+
     def __init__(self, api_key, provider="OpenAI", base_url=None):
         self.api_key = api_key
         self.provider = provider
         self.base_url = base_url
-        self.rag_retriever = SmartRAGRetriever(api_key, provider, base_url)
-        
+        # RAG retriever is created lazily - most progressive fetches never
+        # touch RAG, so don't pay its setup cost on every instantiation
+        self._rag_retriever = None
+        self._llm_sem = threading.BoundedSemaphore(LLM_CONCURRENCY)
+        self._llm_bucket = TokenBucket(LLM_BUCKET_CAPACITY, LLM_BUCKET_REFILL_PER_SEC)
+        # The first-pass prompt is built entirely from constants, so
+        # assemble the multi-KB string once instead of per LLM call
+        self._first_pass_prompt = self._build_first_pass_prompt()
+
+    @property
+    def rag_retriever(self):
+        """Instantiate the RAG retriever on first access"""
+        if self._rag_retriever is None:
+            self._rag_retriever = SmartRAGRetriever(self.api_key, self.provider, self.base_url)
+        return self._rag_retriever
+
     def create_first_pass_prompt(self):
         """Create the first pass prompt with essential system context"""
-        
+        return self._first_pass_prompt
+
+    def _build_first_pass_prompt(self):
+        """Assemble the first pass prompt from the static prompt constants"""
+
         # Include essential parts of system prompt for context awareness
         first_pass_context = f"""
 {HOW_TO}
@@ -71,25 +199,47 @@ Remember:
 """
         return first_pass_context
     
+    def _analysis_cache_key(self, query, conversation_context):
+        """Build a cache key from the query and the recent context it sees"""
+        context_digest = ""
+        if conversation_context:
+            context_digest = "|".join(
+                f"{msg.role}:{msg.content[:200]}" for msg in conversation_context[-5:]
+            )
+        return hashlib.blake2b(
+            f"{query}|{context_digest}".encode(), digest_size=16
+        ).hexdigest()
+
     def analyze_query_needs(self, query, conversation_context=None):
         """First pass: Analyze what data is needed"""
-        
+
+        cache_key = self._analysis_cache_key(query, conversation_context)
+        cached = _analysis_cache.get(cache_key)
+        if cached and time.monotonic() - cached[0] < ANALYSIS_CACHE_TTL:
+            return cached[1]
+
         llm_kwargs = AIProviderConfig.get_llm_config(
             self.provider, 
             self.api_key, 
-            AIProviderConfig.get_default_model(self.provider), 
+            AIProviderConfig.get_default_model(self.provider),
             self.base_url
         )
+        # Native JSON mode guarantees parseable output, so the json.loads
+        # fallback path below stops firing on format drift
+        llm_kwargs["model_kwargs"] = {"response_format": {"type": "json_object"}}
         llm = ChatOpenAI(**llm_kwargs)
         
         first_pass_prompt = self.create_first_pass_prompt()
         
-        # Add conversation context if available
+        # Add conversation context if available (list+join over += churn)
         context_str = ""
         if conversation_context:
-            context_str = "\nRecent conversation:\n"
-            for msg in conversation_context[-5:]:  # Last 5 messages
-                context_str += f"{msg.role}: {msg.content[:200]}...\n"
+            context_parts = ["\nRecent conversation:\n"]
+            context_parts.extend(
+                f"{msg.role}: {msg.content[:200]}...\n"
+                for msg in conversation_context[-5:]  # Last 5 messages
+            )
+            context_str = "".join(context_parts)
         
         full_prompt = f"""{first_pass_prompt}
 
@@ -100,7 +250,10 @@ User Query: {query}
 Analyze this query and respond with the JSON format specified above."""
         
         try:
-            response = llm.invoke(full_prompt)
+            # Bound in-flight LLM calls and pace them through the bucket
+            with self._llm_sem:
+                self._llm_bucket.acquire()
+                response = llm.invoke(full_prompt)
             analysis = json.loads(response.content)
             
             # Validate and sanitize SQL queries if present
@@ -110,7 +263,12 @@ Analyze this query and respond with the JSON format specified above."""
                     sql = query_spec.get("query", "")
                     if sql and not self._is_safe_sql(sql):
                         query_spec["query"] = ""  # Remove unsafe query
-                        
+
+            # Cache the parsed analysis, evicting the oldest entry when full
+            if len(_analysis_cache) >= ANALYSIS_CACHE_MAX_ENTRIES:
+                _analysis_cache.pop(next(iter(_analysis_cache)))
+            _analysis_cache[cache_key] = (time.monotonic(), analysis)
+
             return analysis
             
         except Exception as e:
@@ -123,103 +281,208 @@ Analyze this query and respond with the JSON format specified above."""
             }
     
     def _is_safe_sql(self, sql):
-        """Quick safety check for SQL queries"""
-        unsafe_keywords = ['DELETE', 'DROP', 'TRUNCATE', 'ALTER', 'UPDATE', 'GRANT', 'REVOKE']
-        sql_upper = sql.upper()
-        return not any(keyword in sql_upper for keyword in unsafe_keywords)
+        """Safety check for SQL queries
+
+        Parses the statement when sqlglot is available, so quoted strings
+        and comment tricks can't hide a forbidden operation from a keyword
+        scan. Falls back to the compiled keyword regex otherwise.
+        """
+        if sqlglot is None:
+            return _UNSAFE_SQL_RE.search(sql) is None
+
+        try:
+            tree = sqlglot.parse_one(sql, read="mysql")
+        except sqlglot.errors.ParseError:
+            return False
+
+        if tree is None or not isinstance(tree, sqlglot_exp.Select):
+            return False
+
+        return tree.find(*_FORBIDDEN_SQL_NODES) is None
     
     def fetch_progressive_data(self, needs_analysis):
-        """Fetch data based on analysis"""
+        """Fetch data based on analysis (sync wrapper for existing callers)"""
+        return asyncio.run(self.fetch_progressive_data_async(needs_analysis))
+
+    async def fetch_progressive_data_async(self, needs_analysis):
+        """Fetch data based on analysis, overlapping RAG searches with DB work
+
+        Only the RAG searches run in threads: they are network/embedding
+        bound and independent. All database fetches stay on this thread
+        because frappe.local.db is a single pymysql connection that is
+        not safe for concurrent queries - parallelizing them races the
+        wire protocol ("commands out of sync").
+        """
         fetched_data = {}
         errors = []
-        
+
         needs = needs_analysis.get("needs_data", {})
-        
-        # 1. Execute SQL queries if needed
+
+        # Per-run semaphore (asyncio.run gives each call its own loop) so a
+        # large fan-out can't swamp the embedding provider
+        rag_sem = asyncio.Semaphore(RAG_SEARCH_CONCURRENCY)
+
+        async def limited_rag(search_query):
+            async with rag_sem:
+                # allow_cold=False: workers must never rebuild an index,
+                # since the DB work that involves would race the serial
+                # fetches below over the shared connection
+                return await asyncio.to_thread(self._search_rag, search_query, 3, False)
+
+        # Kick the RAG searches off first so their network time overlaps
+        # the serial DB fetches below
+        rag_tasks = []
+        rag_queries = []
+        if needs.get("rag_search", {}).get("needed"):
+            fetched_data["rag_results"] = []
+            rag_queries = needs["rag_search"].get("queries", [])
+
+        if rag_queries:
+            # Build the retriever and load its index here, on the
+            # request thread - cold construction queries the database,
+            # which must not happen from the worker threads
+            try:
+                self.rag_retriever.warm()
+            except Exception as e:
+                errors.append(f"RAG warm-up error: {str(e)}")
+
+            rag_tasks = [
+                asyncio.create_task(limited_rag(search_query))
+                for search_query in rag_queries
+            ]
+            # One loop pass lets each task dispatch into its worker
+            # thread before the blocking DB work starts
+            await asyncio.sleep(0)
+
+        # 1. SQL queries
         if needs.get("database_queries"):
             fetched_data["query_results"] = {}
             for query_spec in needs["database_queries"]:
+                sql = query_spec.get("query")
+                if not sql:
+                    continue
                 try:
-                    sql = query_spec.get("query")
-                    if sql:
-                        result = validate_and_execute_query(sql)
-                        if result["success"]:
-                            fetched_data["query_results"][query_spec["purpose"]] = {
-                                "data": result["data"],
-                                "fields": query_spec.get("expected_fields", [])
-                            }
-                        else:
-                            errors.append(f"Query failed: {result.get('error')}")
+                    result = validate_and_execute_query(sql)
                 except Exception as e:
                     errors.append(f"Query execution error: {str(e)}")
-        
-        # 2. Get doctype schemas if needed
+                    continue
+                if result["success"]:
+                    fetched_data["query_results"][query_spec["purpose"]] = {
+                        "data": result["data"],
+                        "fields": query_spec.get("expected_fields", [])
+                    }
+                else:
+                    errors.append(f"Query failed: {result.get('error')}")
+
+        # 2. Doctype schemas
         if needs.get("doctypes_schema"):
             fetched_data["schemas"] = {}
             for doctype in needs["doctypes_schema"]:
                 try:
-                    # Get doctype metadata
-                    if frappe.db.exists("DocType", doctype):
-                        meta = frappe.get_meta(doctype)
-                        schema_info = {
-                            "doctype": doctype,
-                            "module": meta.module,
-                            "is_submittable": meta.is_submittable,
-                            "fields": []
-                        }
-                        
-                        for field in meta.fields:
-                            schema_info["fields"].append({
-                                "fieldname": field.fieldname,
-                                "fieldtype": field.fieldtype,
-                                "label": field.label,
-                                "options": field.options,
-                                "reqd": field.reqd,
-                                "hidden": field.hidden
-                            })
-                        
-                        fetched_data["schemas"][doctype] = schema_info
+                    schema = self._fetch_schema(doctype)
                 except Exception as e:
                     errors.append(f"Schema fetch error for {doctype}: {str(e)}")
-        
-        # 3. RAG search if needed
-        if needs.get("rag_search", {}).get("needed"):
-            fetched_data["rag_results"] = []
-            queries = needs["rag_search"].get("queries", [])
-            
-            for search_query in queries:
-                try:
-                    results = self.rag_retriever.get_relevant_documents(search_query, top_k=3)
-                    fetched_data["rag_results"].extend(results)
-                except Exception as e:
-                    errors.append(f"RAG search error: {str(e)}")
-        
-        # 4. Get specific records if needed
+                    continue
+                if schema:
+                    fetched_data["schemas"][doctype] = schema
+
+        # 3. Specific records
         if needs.get("specific_records"):
             doctype = needs["specific_records"].get("doctype")
             names = needs["specific_records"].get("names", [])
-            
+
             if doctype and names:
                 fetched_data["records"] = {}
-                for name in names:
-                    try:
-                        if frappe.db.exists(doctype, name):
-                            doc = frappe.get_doc(doctype, name)
-                            fetched_data["records"][name] = doc.as_dict()
-                    except Exception as e:
-                        errors.append(f"Error fetching {doctype} {name}: {str(e)}")
-        
-        # 5. Code analysis if needed
+                try:
+                    fetched_data["records"].update(self._fetch_records(doctype, names))
+                except Exception as e:
+                    errors.append(f"Error fetching {doctype} records: {str(e)}")
+
+        # 4. Code analysis if needed
         if needs.get("code_analysis", {}).get("needed"):
             # This would use the existing RAG code loading functionality
             # but with specific file targeting
             fetched_data["code_analysis"] = []
             # Implementation would go here
-        
+
+        # 5. Collect the RAG searches last - by now their threads have
+        # been running alongside the DB work
+        if rag_tasks:
+            rag_results = await asyncio.gather(*rag_tasks, return_exceptions=True)
+            for search_query, result in zip(rag_queries, rag_results):
+                if isinstance(result, Exception):
+                    errors.append(f"RAG search error: {str(result)}")
+                    continue
+                if result is None:
+                    # Index went cold before the worker ran; redo this
+                    # search here so any rebuild's DB work stays on the
+                    # request thread
+                    try:
+                        result = self._search_rag(search_query, 3)
+                    except Exception as e:
+                        errors.append(f"RAG search error: {str(e)}")
+                        continue
+                fetched_data["rag_results"].extend(result)
+
         if errors:
             fetched_data["errors"] = errors
-            
+
         return fetched_data
+
+    def _fetch_schema(self, doctype):
+        """Fetch schema information for a single doctype"""
+        try:
+            # Skip the frappe.db.exists probe - a missing doctype just
+            # raises, saving one SELECT per lookup
+            meta = frappe.get_meta(doctype)
+        except frappe.DoesNotExistError:
+            return None
+
+        return _serialize_meta(doctype, str(meta.modified))
+
+    def _search_rag(self, search_query, top_k=3, allow_cold=True):
+        """RAG search with a shared TTL cache keyed on the normalized query
+
+        allow_cold=False marks calls running on worker threads: when the
+        retriever or its index would need (re)building - database work
+        that must stay on the request thread - the search returns None
+        and the caller retries serially.
+        """
+        cache_key = (search_query.strip().lower(), top_k)
+        cached = _rag_result_cache.get(cache_key)
+        if cached and time.monotonic() - cached[0] < RAG_CACHE_TTL:
+            return cached[1]
+
+        if not allow_cold:
+            retriever = self._rag_retriever
+            if retriever is None or not retriever.is_warm():
+                return None
+
+        results = self.rag_retriever.get_relevant_documents(search_query, top_k=top_k)
+
+        if len(_rag_result_cache) >= RAG_CACHE_MAX_ENTRIES:
+            _rag_result_cache.pop(next(iter(_rag_result_cache)))
+        _rag_result_cache[cache_key] = (time.monotonic(), results)
+
+        return results
+
+    def _fetch_records(self, doctype, names):
+        """Fetch the requested records with child tables, indexed by name
+
+        One IN query replaces the per-name exists probe; the surviving
+        names then hydrate through get_cached_doc, so child tables
+        (items, schedules, ...) stay in the LLM payload and repeat
+        fetches of hot documents skip the database entirely.
+        """
+        existing = frappe.get_all(
+            doctype,
+            filters={"name": ["in", names]},
+            pluck="name"
+        )
+        return {
+            name: frappe.get_cached_doc(doctype, name).as_dict()
+            for name in existing
+        }
     
     def format_data_for_context(self, fetched_data):
         """Format fetched data for LLM context"""
@@ -230,14 +493,16 @@ Analyze this query and respond with the JSON format specified above."""
             context_parts.append("📊 DATABASE QUERY RESULTS:")
             for purpose, result in fetched_data["query_results"].items():
                 context_parts.append(f"\n{purpose}:")
-                if result["data"]:
-                    # Format as table-like structure
+                data = result["data"]
+                if data:
+                    # Format as table-like structure; compact separators keep
+                    # prompt bytes (and LLM tokens) down
                     if result["fields"]:
                         context_parts.append(f"Fields: {', '.join(result['fields'])}")
-                    for row in result["data"][:10]:  # Limit to 10 rows
-                        context_parts.append(f"  {json.dumps(row, default=str)}")
-                    if len(result["data"]) > 10:
-                        context_parts.append(f"  ... and {len(result['data']) - 10} more rows")
+                    for row in data[:10]:  # Limit to 10 rows
+                        context_parts.append(f"  {json.dumps(row, default=str, separators=(',', ':'))}")
+                    if len(data) > 10:
+                        context_parts.append(f"  ... and {len(data) - 10} more rows")
                 else:
                     context_parts.append("  No data found")
         
@@ -249,10 +514,12 @@ Analyze this query and respond with the JSON format specified above."""
                 context_parts.append(f"  Module: {schema['module']}")
                 context_parts.append(f"  Submittable: {'Yes' if schema['is_submittable'] else 'No'}")
                 context_parts.append("  Key Fields:")
-                for field in schema["fields"][:15]:  # Show top 15 fields
-                    if not field["hidden"]:
-                        req = " (required)" if field["reqd"] else ""
-                        context_parts.append(f"    - {field['fieldname']}: {field['label']} ({field['fieldtype']}){req}")
+                # Filter hidden fields before slicing so they don't eat the
+                # 15-field budget
+                visible_fields = [f for f in schema["fields"] if not f["hidden"]][:15]
+                for field in visible_fields:
+                    req = " (required)" if field["reqd"] else ""
+                    context_parts.append(f"    - {field['fieldname']}: {field['label']} ({field['fieldtype']}){req}")
         
         # Format RAG results
         if fetched_data.get("rag_results"):
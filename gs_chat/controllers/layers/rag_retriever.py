@@ -1,35 +1,131 @@
 
+import asyncio
+import collections
+import dataclasses
 import frappe
+import heapq
+import itertools
 import time
 import os
 import json
 import ast
+import hashlib
 import pickle
 import concurrent.futures
 import re
+import sqlite3
+import threading
 from datetime import datetime, timedelta
 from gs_chat.controllers.industries import get_industry_handler
 
 try:
-    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    import orjson
 except ImportError:
-    from langchain.text_splitter import RecursiveCharacterTextSplitter
-
-try:
-    from langchain_community.vectorstores import FAISS
-except ImportError:
-    from langchain.vectorstores import FAISS
-
-try:
-    from langchain_openai import OpenAIEmbeddings
-except ImportError:
-    from langchain.embeddings import OpenAIEmbeddings
+    orjson = None
 
 try:
     from langchain_core.documents import Document
 except ImportError:
     from langchain.schema import Document
 
+
+@dataclasses.dataclass(slots=True)
+class LightDoc:
+    """Slot-based stand-in for langchain's pydantic Document
+
+    Thousands of corpus entries sit in memory before embedding, and the
+    per-object pydantic overhead dominates at that scale. Downstream
+    consumers (content hashing, FAISS.from_documents) only read
+    page_content and metadata, so these pass through unchanged.
+    """
+    page_content: str
+    metadata: dict
+
+
+def _import_text_splitter():
+    """Import the text splitter on first use instead of at worker startup"""
+    try:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+    except ImportError:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter
+
+
+def _import_faiss_store():
+    """Import the langchain FAISS wrapper (and its native faiss.so) on first use"""
+    try:
+        from langchain_community.vectorstores import FAISS
+    except ImportError:
+        from langchain.vectorstores import FAISS
+    return FAISS
+
+# Index tiering: tiny corpora stay on the exhaustive flat index, mid-size
+# corpora get an HNSW graph (fast, no training step), and large corpora
+# move to IVF+PQ where compression and cell-probing both pay off
+HNSW_MIN_VECTORS = 1000
+IVFPQ_MIN_VECTORS = 10000
+
+# Embedding ingestion: texts per HTTP batch and how many batches to keep
+# in flight - the ingest is network-bound, so overlapping requests gives
+# near-linear speedup up to the API rate limit
+EMBED_BATCH_SIZE = 1000
+EMBED_CONCURRENCY = 5
+
+
+_concurrent_embeddings_cls = None
+
+
+def _get_concurrent_embeddings_cls():
+    """Build the concurrent embeddings class on first use
+
+    Defined lazily so importing this module doesn't pull in
+    langchain_openai (and its OpenAI client stack) for workers that
+    never touch RAG.
+    """
+    global _concurrent_embeddings_cls
+    if _concurrent_embeddings_cls is not None:
+        return _concurrent_embeddings_cls
+
+    try:
+        from langchain_openai import OpenAIEmbeddings
+    except ImportError:
+        from langchain.embeddings import OpenAIEmbeddings
+
+    class ConcurrentOpenAIEmbeddings(OpenAIEmbeddings):
+        """OpenAIEmbeddings that overlaps its ingestion batches
+
+        The stock embed_documents sends one HTTP batch at a time, so embedding
+        a large knowledge base is a chain of serial round-trips. This variant
+        fans the batches out through the async client under a bounded
+        semaphore and reassembles results in input order.
+        """
+
+        def embed_documents(self, texts, chunk_size=None):
+            batch_size = chunk_size or EMBED_BATCH_SIZE
+            batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+            # A single batch gains nothing from the async detour
+            if len(batches) <= 1:
+                return super().embed_documents(texts, chunk_size=batch_size)
+
+            async def _embed_all():
+                semaphore = asyncio.Semaphore(EMBED_CONCURRENCY)
+
+                async def _embed_batch(batch):
+                    async with semaphore:
+                        return await self.aembed_documents(batch, chunk_size=batch_size)
+
+                # gather preserves argument order, so flattening keeps each
+                # embedding aligned with its source text
+                results = await asyncio.gather(*[_embed_batch(b) for b in batches])
+                return [emb for batch_embs in results for emb in batch_embs]
+
+            return asyncio.run(_embed_all())
+
+    _concurrent_embeddings_cls = ConcurrentOpenAIEmbeddings
+    return _concurrent_embeddings_cls
+
+
 # RAG components cache
 rag_cache = {
     "vector_store": None,
@@ -37,6 +133,211 @@ rag_cache = {
     "last_updated": None
 }
 
+# Serializes in-process vector-store rebuilds so concurrent requests
+# hitting an expired cache don't all re-embed the knowledge base
+_rag_lock = threading.Lock()
+
+# Short-lived per-query result cache - hot chat traffic repeats the same
+# questions, and a hit skips the query embedding and index search. The
+# version counter is bumped on every store refresh so stale results
+# never outlive the index they came from.
+QUERY_RESULT_CACHE_TTL = 300
+QUERY_RESULT_CACHE_MAX = 512
+_query_result_cache = {}
+_query_cache_version = 0
+
+# Query embeddings are index-independent, so unlike search results they
+# stay valid across store refreshes and need no version in the key
+QUERY_EMBEDDING_CACHE_MAX = 256
+_query_embedding_cache = {}
+
+# Tokenizer shared by lightweight indexing and querying - words shorter
+# than 3 chars were already skipped by the old scoring loop
+_WORD_RE = re.compile(r'\w{3,}')
+
+# Directories never worth walking for code context
+_SKIP_DIRS = frozenset({'__pycache__', 'node_modules', '.git', 'dist'})
+
+# Files above this size are skipped by the code loader
+CODE_FILE_MAX_BYTES = 10000
+
+
+class _CodeInfoVisitor(ast.NodeVisitor):
+    """Collect class/function summaries in a single targeted pass
+
+    Unlike ast.walk, which yields every node down to individual
+    expressions, this only visits the top-level definitions the summary
+    actually uses.
+    """
+
+    def __init__(self):
+        self.parts = []
+
+    def visit_ClassDef(self, node):
+        self.parts.append(f"\nClass: {node.name}")
+        docstring = ast.get_docstring(node)
+        if docstring:
+            self.parts.append(f"Description: {docstring}")
+
+        methods = [n.name for n in node.body if isinstance(n, ast.FunctionDef)]
+        if methods:
+            self.parts.append(f"Methods: {', '.join(methods)}")
+        # No generic_visit - methods are already summarized above
+
+    def visit_FunctionDef(self, node):
+        if node.col_offset == 0:
+            self.parts.append(f"\nFunction: {node.name}")
+            docstring = ast.get_docstring(node)
+            if docstring:
+                self.parts.append(f"Description: {docstring}")
+
+# Lightweight-mode keyword index, rebuilt on the same 1-hour cadence as
+# the vector store
+LIGHTWEIGHT_INDEX_TTL = 3600
+_lightweight_index_cache = {
+    "documents": None,
+    "inverted_index": None,
+    "fts_enabled": False,
+    "built_at": 0
+}
+
+# Static documentation content - the source dicts never change, so the
+# Document lists are built once at import instead of on every rebuild
+_SYSTEM_DOC_DATA = [
+    {
+        "title": "Sales Invoice Creation",
+        "content": """To create a Sales Invoice in Growth ERP:
+        1. Go to Accounts > Sales Invoice
+        2. Select Customer
+        3. Add Items with quantities and rates
+        4. Set posting date
+        5. Save and Submit
+
+        Key fields: customer, posting_date, items, taxes, grand_total""",
+        "category": "Sales"
+    },
+    {
+        "title": "Customer Management",
+        "content": """Customer management in Growth ERP:
+        1. Create Customer: CRM > Customer > New
+        2. Set customer group and territory
+        3. Add contact and address details
+        4. Configure payment terms
+        5. Set credit limits if needed
+
+        Key fields: customer_name, customer_group, territory, payment_terms""",
+        "category": "CRM"
+    },
+    {
+        "title": "Item Master Setup",
+        "content": """Item Master configuration:
+        1. Go to Stock > Item > New
+        2. Set item code and name
+        3. Choose item group
+        4. Set UOM (Unit of Measure)
+        5. Configure valuation and accounting
+        6. Set reorder levels
+
+        Key fields: item_code, item_name, item_group, stock_uom, valuation_rate""",
+        "category": "Stock"
+    },
+    {
+        "title": "Purchase Order Process",
+        "content": """Purchase Order workflow:
+        1. Go to Buying > Purchase Order
+        2. Select Supplier
+        3. Add items with quantities
+        4. Set delivery date
+        5. Save and Submit
+        6. Create Purchase Receipt upon delivery
+        7. Create Purchase Invoice for payment
+
+        Key fields: supplier, transaction_date, items, delivery_date, grand_total""",
+        "category": "Buying"
+    }
+]
+
+_PROCESS_DOC_DATA = [
+    {
+        "title": "Lead to Customer Conversion",
+        "content": """Lead to Customer conversion process:
+        1. Create Lead in CRM module
+        2. Qualify lead through follow-ups
+        3. Convert qualified lead to Opportunity
+        4. Create Quotation from Opportunity
+        5. Convert Quotation to Sales Order
+        6. Convert Customer from Lead when ready
+
+        Key reports: Lead Details, Conversion Rate, Sales Funnel""",
+        "category": "CRM Process"
+    },
+    {
+        "title": "Order to Cash Process",
+        "content": """Complete Order to Cash workflow:
+        1. Receive Sales Order from customer
+        2. Check item availability in stock
+        3. Create Delivery Note for shipment
+        4. Generate Sales Invoice for billing
+        5. Record Payment Entry when received
+        6. Update customer ledger
+
+        Key documents: Sales Order, Delivery Note, Sales Invoice, Payment Entry""",
+        "category": "Sales Process"
+    },
+    {
+        "title": "Procure to Pay Process",
+        "content": """Procurement to Payment workflow:
+        1. Create Material Request for requirements
+        2. Generate Purchase Order to supplier
+        3. Receive goods via Purchase Receipt
+        4. Verify Purchase Invoice from supplier
+        5. Make Payment Entry to supplier
+        6. Update supplier ledger
+
+        Key documents: Material Request, Purchase Order, Purchase Receipt, Purchase Invoice""",
+        "category": "Buying Process"
+    },
+    {
+        "title": "Inventory Management",
+        "content": """Stock management best practices:
+        1. Maintain accurate item masters
+        2. Set reorder levels for automatic procurement
+        3. Conduct regular stock reconciliation
+        4. Use batch/serial tracking for traceability
+        5. Monitor stock aging and movement
+        6. Implement ABC analysis for optimization
+
+        Key reports: Stock Balance, Stock Ledger, Stock Aging, Reorder Report""",
+        "category": "Stock Process"
+    }
+]
+
+_SYSTEM_DOCUMENTS = [
+    Document(
+        page_content=f"Title: {doc_info['title']}\n\nContent: {doc_info['content']}",
+        metadata={
+            "source": "System Documentation",
+            "title": doc_info['title'],
+            "category": doc_info['category'],
+            "type": "system_doc"
+        }
+    )
+    for doc_info in _SYSTEM_DOC_DATA
+]
+
+_PROCESS_DOCUMENTS = [
+    Document(
+        page_content=f"Process: {process['title']}\n\nDetails: {process['content']}",
+        metadata={
+            "source": "Process Documentation",
+            "title": process['title'],
+            "category": process['category'],
+            "type": "process_doc"
+        }
+    )
+    for process in _PROCESS_DOC_DATA
+]
+
 class SmartRAGRetriever:
     """Enhanced RAG implementation with resource optimization for smaller instances"""
 
@@ -62,6 +363,19 @@ class SmartRAGRetriever:
         else:
             self.lightweight_mode = lightweight_mode
 
+        # Middle tier between full FP32 and no embeddings at all: enough
+        # RAM to run vector search, but tight enough that int8 scalar
+        # quantization (4x smaller index, 4x less bandwidth) is worth the
+        # small recall loss
+        self.quantize_index = False
+        if not self.lightweight_mode:
+            try:
+                import psutil
+                available_gb = psutil.virtual_memory().available / (1024**3)
+                self.quantize_index = available_gb < 4
+            except ImportError:
+                pass
+
         # MODIFY THIS SECTION: Try to load from cache first
         if not self.lightweight_mode:
             self.embeddings = self._get_embeddings()
@@ -78,7 +392,7 @@ class SmartRAGRetriever:
             self.embeddings = None
 
         # Keep the existing text_splitter configuration
-        self.text_splitter = RecursiveCharacterTextSplitter(
+        self.text_splitter = _import_text_splitter()(
             chunk_size=2000,  # Increase from 500/1000
             chunk_overlap=200,
             separators=["\n\n", "\n---\n", "\nFields:\n", "\n"]  # Better separators
@@ -94,7 +408,10 @@ class SmartRAGRetriever:
             enhanced_query = query
 
         if self.lightweight_mode:
-            return self._simple_search(enhanced_query, k)
+            # Single-pass tokenized scoring via the inverted index - each
+            # document is tokenized once at index build, so scoring is
+            # hash lookups instead of per-word substring scans
+            return self._lightweight_search(enhanced_query, k)
         else:
             if self.vector_store:
                 return self.vector_store.similarity_search(enhanced_query, k=k)
@@ -122,7 +439,10 @@ class SmartRAGRetriever:
             # Build the vector store (use existing logic)
             documents = self._load_all_documents()
             if documents and self.embeddings:
-                self.vector_store = FAISS.from_documents(documents, self.embeddings)
+                FAISS = _import_faiss_store()
+                self.vector_store = self._optimize_index(
+                    FAISS.from_documents(documents, self.embeddings)
+                )
 
                 # Cache the vector store
                 cached_data = pickle.dumps(self.vector_store)
@@ -132,6 +452,144 @@ class SmartRAGRetriever:
         except Exception as e:
             frappe.logger().error(f"Error building vector store: {str(e)}")
 
+    def _index_paths(self):
+        """Return on-disk paths for the persisted FAISS index and docstore"""
+        base_path = frappe.get_site_path("private", "files")
+        return (
+            os.path.join(base_path, "gs_chat_rag.faiss"),
+            os.path.join(base_path, "gs_chat_rag.pkl")
+        )
+
+    def _meta_path(self):
+        """Return the on-disk path for the persisted index metadata"""
+        return os.path.join(frappe.get_site_path("private", "files"), "gs_chat_rag.meta.json")
+
+    def _content_hash(self, documents):
+        """Fingerprint the loaded corpus so unchanged content skips re-embedding"""
+        hasher = hashlib.sha256()
+        for doc in documents:
+            hasher.update(hashlib.sha256(doc.page_content.encode()).digest())
+        return hasher.hexdigest()
+
+    def _load_persisted_content_hash(self):
+        """Read the content hash stored alongside the persisted index"""
+        try:
+            meta_path = self._meta_path()
+            if os.path.exists(meta_path):
+                with open(meta_path, 'r') as f:
+                    return json.load(f).get("content_hash")
+        except Exception as e:
+            frappe.logger().error(f"Error reading index metadata: {str(e)}")
+        return None
+
+    def _save_index_to_disk(self, vector_store, content_hash=None):
+        """Persist the FAISS index and docstore so worker restarts skip the rebuild"""
+        try:
+            import faiss
+
+            index_path, docstore_path = self._index_paths()
+            faiss.write_index(vector_store.index, index_path)
+            with open(docstore_path, 'wb') as f:
+                pickle.dump((vector_store.docstore, vector_store.index_to_docstore_id), f)
+            if content_hash:
+                with open(self._meta_path(), 'w') as f:
+                    json.dump({"content_hash": content_hash}, f)
+            frappe.logger().info("Persisted FAISS index to disk")
+
+        except Exception as e:
+            frappe.log_error(f"Error persisting FAISS index: {str(e)}")
+
+    def _load_index_from_disk(self):
+        """Load the persisted FAISS index via mmap so workers share one read-only copy"""
+        try:
+            import faiss
+
+            index_path, docstore_path = self._index_paths()
+            if not (os.path.exists(index_path) and os.path.exists(docstore_path)):
+                return None
+
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            with open(docstore_path, 'rb') as f:
+                docstore, index_to_docstore_id = pickle.load(f)
+
+            FAISS = _import_faiss_store()
+            return FAISS(
+                embedding_function=self.embeddings,
+                index=index,
+                docstore=docstore,
+                index_to_docstore_id=index_to_docstore_id
+            )
+
+        except Exception as e:
+            frappe.log_error(f"Error loading persisted FAISS index: {str(e)}")
+            return None
+
+    def _delete_persisted_index(self):
+        """Remove the on-disk index files so the next build starts fresh"""
+        for path in self._index_paths() + (self._meta_path(),):
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError as e:
+                frappe.log_error(f"Error deleting persisted index {path}: {str(e)}")
+
+    def _optimize_index(self, vector_store):
+        """Swap the default flat FAISS index for a sub-linear one on larger corpora
+
+        The flat index langchain builds holds every vector uncompressed and
+        scans all of them per query. Mid-size corpora get an HNSW graph
+        (no training needed, near-exact recall); large ones get IVF+PQ,
+        which compresses vectors to a few bytes and probes only a subset
+        of clusters. Small corpora are left on the flat index unchanged.
+        """
+        try:
+            import faiss
+            import math
+
+            flat_index = vector_store.index
+            ntotal = getattr(flat_index, "ntotal", 0)
+
+            if ntotal < HNSW_MIN_VECTORS and not self.quantize_index:
+                return vector_store
+
+            dimension = flat_index.d
+            vectors = flat_index.reconstruct_n(0, ntotal)
+
+            if ntotal < IVFPQ_MIN_VECTORS and self.quantize_index:
+                # Memory-constrained host: int8 scalar quantization keeps
+                # exhaustive search but quarters the index footprint
+                index = faiss.IndexScalarQuantizer(
+                    dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2
+                )
+                index.train(vectors)
+                index.add(vectors)
+                label = "SQ8"
+            elif ntotal < IVFPQ_MIN_VECTORS:
+                # HNSW with 32 neighbors per node - build-only cost, no
+                # training pass required
+                index = faiss.IndexHNSWFlat(dimension, 32)
+                index.add(vectors)
+                label = "HNSW"
+            else:
+                # Scale cluster count with corpus size; 16 sub-quantizers
+                # of 8 bits each compress 1536-dim floats ~384x
+                nlist = max(4, int(math.sqrt(ntotal)))
+                quantizer = faiss.IndexFlatL2(dimension)
+                index = faiss.IndexIVFPQ(quantizer, dimension, nlist, 16, 8)
+                index.train(vectors)
+                index.add(vectors)
+                index.nprobe = 8
+                label = "IVF+PQ"
+
+            # Vector ids are sequential, so the docstore mapping stays valid
+            vector_store.index = index
+            frappe.logger().info(f"FAISS index rebuilt as {label} ({ntotal} vectors)")
+
+        except Exception as e:
+            frappe.log_error(f"Error optimizing FAISS index: {str(e)}")
+
+        return vector_store
+
     def _load_all_documents(self):
         """Consolidated method to load all documents"""
         documents = []
@@ -142,14 +600,16 @@ class SmartRAGRetriever:
 
     def _get_embeddings(self):
         """Get embeddings model based on provider"""
+        embeddings_cls = _get_concurrent_embeddings_cls()
+
         if self.provider == "OpenAI":
-            return OpenAIEmbeddings(openai_api_key=self.api_key)
+            return embeddings_cls(openai_api_key=self.api_key)
         elif self.provider == "DeepSeek":
             # DeepSeek doesn't have embeddings API, fallback to OpenAI
             # You might want to use a different embedding service
-            return OpenAIEmbeddings(openai_api_key=self.api_key)
+            return embeddings_cls(openai_api_key=self.api_key)
         else:
-            return OpenAIEmbeddings(openai_api_key=self.api_key)
+            return embeddings_cls(openai_api_key=self.api_key)
 
     def _detect_lightweight_mode(self):
         """Auto-detect if we should use lightweight mode based on system resources"""
@@ -192,17 +652,54 @@ class SmartRAGRetriever:
             list: List of relevant documents
         """
         try:
+            query_hash = hashlib.blake2b(query.lower().strip().encode(), digest_size=16).hexdigest()
+            cache_key = (_query_cache_version, query_hash, top_k, self.lightweight_mode)
+
+            cached = _query_result_cache.get(cache_key)
+            if cached and time.time() - cached[1] < QUERY_RESULT_CACHE_TTL:
+                return cached[0]
+
             if self.lightweight_mode:
                 # Lightweight mode: Use simple keyword matching instead of vector search
-                return self._lightweight_search(query, top_k)
+                results = self._lightweight_search(query, top_k)
             else:
                 # Full mode: Use vector similarity search
-                return self._vector_search(query, top_k)
+                results = self._vector_search(query, top_k)
+
+            _query_result_cache[cache_key] = (results, time.time())
+            if len(_query_result_cache) > QUERY_RESULT_CACHE_MAX:
+                _query_result_cache.pop(next(iter(_query_result_cache)))
+
+            return results
 
         except Exception as e:
             frappe.log_error(f"RAG retrieval error: {str(e)}")
             return []
 
+    def warm(self):
+        """Load the active index on the calling thread
+
+        Cold loads run frappe.get_all / frappe.db queries; callers that
+        plan to search from worker threads use this to pay that cost on
+        the request thread first, keeping DB work off threads that share
+        its connection.
+        """
+        if self.lightweight_mode:
+            self._get_lightweight_index()
+        else:
+            self._get_or_create_vector_store()
+
+    def is_warm(self):
+        """True when a search can run without (re)building an index"""
+        now = time.time()
+        if self.lightweight_mode:
+            cache = _lightweight_index_cache
+            return (cache["documents"] is not None and
+                    now - cache["built_at"] <= LIGHTWEIGHT_INDEX_TTL)
+        return (rag_cache["vector_store"] is not None and
+                rag_cache["last_updated"] is not None and
+                now - rag_cache["last_updated"] <= 3600)
+
     def _vector_search(self, query, top_k):
         """Full vector similarity search"""
         # Get or create vector store
@@ -211,8 +708,18 @@ class SmartRAGRetriever:
         if not vector_store:
             return []
 
+        # Embed the query once per normalized text - repeats skip the
+        # embedding API call and go straight to the FAISS search
+        embedding_key = query.strip().lower()
+        query_embedding = _query_embedding_cache.get(embedding_key)
+        if query_embedding is None:
+            query_embedding = self.embeddings.embed_query(query)
+            _query_embedding_cache[embedding_key] = query_embedding
+            if len(_query_embedding_cache) > QUERY_EMBEDDING_CACHE_MAX:
+                _query_embedding_cache.pop(next(iter(_query_embedding_cache)))
+
         # Perform similarity search
-        relevant_docs = vector_store.similarity_search(query, k=top_k)
+        relevant_docs = vector_store.similarity_search_by_vector(query_embedding, k=top_k)
 
         # Format documents for context
         formatted_docs = []
@@ -225,36 +732,148 @@ class SmartRAGRetriever:
 
         return formatted_docs
 
+    def _get_lightweight_index(self):
+        """Return the cached (documents, inverted index) pair, rebuilding on TTL expiry
+
+        The inverted index maps each word to [(doc_idx, term_frequency)]
+        so a query costs one dict lookup per word instead of a substring
+        scan over every document.
+        """
+        cache = _lightweight_index_cache
+        current_time = time.time()
+
+        if (cache["documents"] is None or
+            current_time - cache["built_at"] > LIGHTWEIGHT_INDEX_TTL):
+            # Sibling workers share one corpus load through a pickle on
+            # disk - the OS page cache dedupes the physical reads, so N
+            # workers don't each re-run the loader queries
+            documents = None
+            docs_path = self._docs_pickle_path()
+            try:
+                if (os.path.exists(docs_path) and
+                    current_time - os.path.getmtime(docs_path) < LIGHTWEIGHT_INDEX_TTL):
+                    with open(docs_path, 'rb') as f:
+                        documents = pickle.load(f)
+            except Exception as e:
+                frappe.logger().error(f"Error loading pickled corpus: {str(e)}")
+                documents = None
+
+            if documents is None:
+                documents = self._load_lightweight_knowledge_base()
+                try:
+                    with open(docs_path, 'wb') as f:
+                        pickle.dump(documents, f, protocol=5)
+                except Exception as e:
+                    frappe.logger().error(f"Error pickling corpus: {str(e)}")
+
+            inverted_index = {}
+            for doc_idx, doc in enumerate(documents):
+                term_counts = collections.Counter(_WORD_RE.findall(doc.page_content.lower()))
+                for word, tf in term_counts.items():
+                    inverted_index.setdefault(word, []).append((doc_idx, tf))
+
+            cache["documents"] = documents
+            cache["inverted_index"] = inverted_index
+            cache["fts_enabled"] = self._build_fts_index(documents)
+            cache["built_at"] = current_time
+
+        return cache["documents"], cache["inverted_index"]
+
+    def _fts_db_path(self):
+        """Return the on-disk path of the SQLite FTS5 index"""
+        return os.path.join(frappe.get_site_path("private", "files"), "gs_chat_rag_fts.db")
+
+    def _docs_pickle_path(self):
+        """Return the on-disk path of the pickled lightweight corpus"""
+        return os.path.join(frappe.get_site_path("private", "files"), "gs_chat_rag_docs.pkl")
+
+    def _build_fts_index(self, documents):
+        """(Re)build the FTS5 table for C-level BM25 scoring; False if unavailable"""
+        try:
+            conn = sqlite3.connect(self._fts_db_path())
+            try:
+                conn.execute("DROP TABLE IF EXISTS docs")
+                conn.execute(
+                    "CREATE VIRTUAL TABLE docs USING fts5(content, tokenize='porter unicode61')"
+                )
+                conn.executemany(
+                    "INSERT INTO docs(rowid, content) VALUES (?, ?)",
+                    [(idx + 1, doc.page_content) for idx, doc in enumerate(documents)]
+                )
+                conn.commit()
+            finally:
+                conn.close()
+            return True
+        except sqlite3.OperationalError:
+            # sqlite built without the FTS5 extension - the Python
+            # inverted index remains the scorer
+            return False
+        except Exception as e:
+            frappe.logger().error(f"Error building FTS index: {str(e)}")
+            return False
+
+    def _fts_search(self, documents, query, top_k):
+        """BM25-ranked search via FTS5; None signals fallback to Python scoring"""
+        tokens = _WORD_RE.findall(query.lower())
+        if not tokens:
+            return []
+
+        try:
+            conn = sqlite3.connect(self._fts_db_path())
+            try:
+                # OR-match mirrors the term-frequency scorer's recall;
+                # bm25() ranks ascending (lower is better)
+                rows = conn.execute(
+                    "SELECT rowid, bm25(docs) FROM docs WHERE docs MATCH ? "
+                    "ORDER BY bm25(docs) LIMIT ?",
+                    (" OR ".join(tokens), top_k)
+                ).fetchall()
+            finally:
+                conn.close()
+        except Exception as e:
+            frappe.logger().error(f"FTS search failed, falling back: {str(e)}")
+            return None
+
+        return [
+            {
+                "content": documents[rowid - 1].page_content,
+                "metadata": documents[rowid - 1].metadata,
+                "source": documents[rowid - 1].metadata.get("source", "Unknown"),
+                "score": -rank
+            }
+            for rowid, rank in rows
+        ]
+
     def _lightweight_search(self, query, top_k):
         """Lightweight keyword-based search for resource-constrained environments"""
         try:
-            # Load documents without creating vector store
-            documents = self._load_lightweight_knowledge_base()
-
-            # Simple keyword matching
-            query_words = query.lower().split()
-            scored_docs = []
-
-            for doc in documents:
-                content_lower = doc.page_content.lower()
-                score = 0
-
-                # Count keyword matches
-                for word in query_words:
-                    if len(word) > 2:  # Skip very short words
-                        score += content_lower.count(word)
-
-                if score > 0:
-                    scored_docs.append({
-                        "content": doc.page_content,
-                        "metadata": doc.metadata,
-                        "source": doc.metadata.get("source", "Unknown"),
-                        "score": score
-                    })
-
-            # Sort by score and return top_k
-            scored_docs.sort(key=lambda x: x["score"], reverse=True)
-            return scored_docs[:top_k]
+            documents, inverted_index = self._get_lightweight_index()
+
+            # Prefer the FTS5 table - tokenization and BM25 ranking run in
+            # compiled C instead of the Python scorer below
+            if _lightweight_index_cache["fts_enabled"]:
+                results = self._fts_search(documents, query, top_k)
+                if results is not None:
+                    return results
+
+            # Score via inverted-index lookups - only documents containing
+            # a query word are ever touched
+            scores = collections.Counter()
+            for word in set(_WORD_RE.findall(query.lower())):
+                for doc_idx, tf in inverted_index.get(word, ()):
+                    scores[doc_idx] += tf
+
+            top_docs = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+            return [
+                {
+                    "content": documents[doc_idx].page_content,
+                    "metadata": documents[doc_idx].metadata,
+                    "source": documents[doc_idx].metadata.get("source", "Unknown"),
+                    "score": score
+                }
+                for doc_idx, score in top_docs
+            ]
 
         except Exception as e:
             frappe.log_error(f"Lightweight search error: {str(e)}")
@@ -269,59 +888,97 @@ class SmartRAGRetriever:
         if (rag_cache["last_updated"] is None or
             current_time - rag_cache["last_updated"] > 3600):
 
-            try:
-                # Create new vector store
-                documents = self._load_knowledge_base()
-                if documents and self.embeddings:
-                    frappe.logger().info(f"Creating vector store with {len(documents)} documents")
-                    rag_cache["vector_store"] = FAISS.from_documents(documents, self.embeddings)
-                    rag_cache["last_updated"] = current_time
-                    frappe.logger().info("Vector store created successfully")
-                else:
-                    frappe.logger().warning(f"Cannot create vector store: documents={len(documents) if documents else 0}, embeddings={self.embeddings is not None}")
+            # Double-checked locking: concurrent callers hitting an expired
+            # cache wait here, then find the store another thread just
+            # built instead of rebuilding (and re-embedding) in parallel
+            with _rag_lock:
+                current_time = time.time()
+                if (rag_cache["last_updated"] is not None and
+                    current_time - rag_cache["last_updated"] <= 3600):
+                    return rag_cache["vector_store"]
 
-            except Exception as e:
-                frappe.log_error(f"Failed to create vector store: {str(e)}")
-                rag_cache["vector_store"] = None
+                return self._refresh_vector_store(current_time)
 
         return rag_cache["vector_store"]
 
-    def _load_knowledge_base(self):
-        """Load knowledge base documents from various sources including code files"""
-        documents = []
+    def _refresh_vector_store(self, current_time):
+        """Rebuild or reload the shared vector store; caller holds _rag_lock"""
+        global rag_cache, _query_cache_version
+
+        # Invalidate per-query results built against the previous index
+        _query_cache_version += 1
 
         try:
-            # 1. Load from Help Articles (database)
-            help_articles = self._load_help_articles()
-            documents.extend(help_articles)
+            # Cold start: mmap the persisted on-disk copy instead of
+            # re-embedding the whole knowledge base
+            if rag_cache["vector_store"] is None:
+                persisted_store = self._load_index_from_disk()
+                if persisted_store:
+                    frappe.logger().info("Loaded vector store from disk")
+                    rag_cache["vector_store"] = persisted_store
+                    rag_cache["last_updated"] = current_time
+                    return rag_cache["vector_store"]
+
+            # Create new vector store
+            documents = self._load_knowledge_base()
+            if documents and self.embeddings:
+                # If nothing changed since the persisted build, keep the
+                # warm store and skip the embedding calls entirely
+                content_hash = self._content_hash(documents)
+                if (rag_cache["vector_store"] is not None and
+                    content_hash == self._load_persisted_content_hash()):
+                    frappe.logger().info("Knowledge base unchanged, skipping re-embed")
+                    rag_cache["last_updated"] = current_time
+                    return rag_cache["vector_store"]
 
-            # 2. Load from System Documentation (static)
-            system_docs = self._load_system_documentation()
-            documents.extend(system_docs)
+                frappe.logger().info(f"Creating vector store with {len(documents)} documents")
+                FAISS = _import_faiss_store()
+                rag_cache["vector_store"] = self._optimize_index(
+                    FAISS.from_documents(documents, self.embeddings)
+                )
+                self._save_index_to_disk(rag_cache["vector_store"], content_hash)
+                rag_cache["last_updated"] = current_time
+                frappe.logger().info("Vector store created successfully")
+            else:
+                frappe.logger().warning(f"Cannot create vector store: documents={len(documents) if documents else 0}, embeddings={self.embeddings is not None}")
 
-            # 3. Load from Previous Conversations (learning)
-            conversation_docs = self._load_conversation_history()
-            documents.extend(conversation_docs)
+        except Exception as e:
+            frappe.log_error(f"Failed to create vector store: {str(e)}")
+            rag_cache["vector_store"] = None
 
-            # 4. Load from Business Process Documentation (static)
-            process_docs = self._load_process_documentation()
-            documents.extend(process_docs)
+        return rag_cache["vector_store"]
+
+    def _load_knowledge_base(self):
+        """Load knowledge base documents from various sources including code files"""
+        documents = []
 
-            # 5. 🚀 NEW: Load from Code Files (system understanding)
-            code_docs = self._load_code_files()
-            documents.extend(code_docs)
+        try:
+            # Filesystem/static loaders never touch frappe.db, so they run
+            # in worker threads while the DB-backed loaders execute on the
+            # request thread - frappe.local (and its MySQL connection) is
+            # thread-local, so DB calls must stay here
+            fs_loaders = (
+                self._load_system_documentation,
+                self._load_process_documentation,
+                self._load_code_files,
+                self._load_configuration_files,
+                self._load_doctype_definitions,
+            )
+            db_loaders = (
+                self._load_help_articles,
+                self._load_conversation_history,
+                self._load_database_schema,
+            )
 
-            # 6. 🚀 NEW: Load from Database Schema (data structure)
-            schema_docs = self._load_database_schema()
-            documents.extend(schema_docs)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+                futures = [executor.submit(loader) for loader in fs_loaders]
 
-            # 7. 🚀 NEW: Load from Configuration Files (system behavior)
-            config_docs = self._load_configuration_files()
-            documents.extend(config_docs)
+                # DB round-trips overlap with the pool's disk walks
+                for loader in db_loaders:
+                    documents.extend(loader())
 
-            # 8. 🚀 NEW: Load from DocType Definitions (system structure)
-            doctype_docs = self._load_doctype_definitions()
-            documents.extend(doctype_docs)
+                for future in futures:
+                    documents.extend(future.result())
 
         except Exception as e:
             frappe.log_error(f"Error loading knowledge base: {str(e)}")
@@ -335,9 +992,10 @@ class SmartRAGRetriever:
         try:
             # Check if Help Article doctype exists
             if frappe.db.exists("DocType", "Help Article"):
+                # Only the columns the Document build actually uses
                 articles = frappe.get_all(
                     "Help Article",
-                    fields=["title", "content", "category", "modified"],
+                    fields=["title", "content", "category"],
                     filters={"published": 1}
                 )
 
@@ -360,93 +1018,26 @@ class SmartRAGRetriever:
 
     def _load_system_documentation(self):
         """Load system documentation and common procedures"""
-        documents = []
-
-        # Static documentation content
-        system_docs = [
-            {
-                "title": "Sales Invoice Creation",
-                "content": """To create a Sales Invoice in Growth ERP:
-                1. Go to Accounts > Sales Invoice
-                2. Select Customer
-                3. Add Items with quantities and rates
-                4. Set posting date
-                5. Save and Submit
-
-                Key fields: customer, posting_date, items, taxes, grand_total""",
-                "category": "Sales"
-            },
-            {
-                "title": "Customer Management",
-                "content": """Customer management in Growth ERP:
-                1. Create Customer: CRM > Customer > New
-                2. Set customer group and territory
-                3. Add contact and address details
-                4. Configure payment terms
-                5. Set credit limits if needed
-
-                Key fields: customer_name, customer_group, territory, payment_terms""",
-                "category": "CRM"
-            },
-            {
-                "title": "Item Master Setup",
-                "content": """Item Master configuration:
-                1. Go to Stock > Item > New
-                2. Set item code and name
-                3. Choose item group
-                4. Set UOM (Unit of Measure)
-                5. Configure valuation and accounting
-                6. Set reorder levels
-
-                Key fields: item_code, item_name, item_group, stock_uom, valuation_rate""",
-                "category": "Stock"
-            },
-            {
-                "title": "Purchase Order Process",
-                "content": """Purchase Order workflow:
-                1. Go to Buying > Purchase Order
-                2. Select Supplier
-                3. Add items with quantities
-                4. Set delivery date
-                5. Save and Submit
-                6. Create Purchase Receipt upon delivery
-                7. Create Purchase Invoice for payment
-
-                Key fields: supplier, transaction_date, items, delivery_date, grand_total""",
-                "category": "Buying"
-            }
-        ]
-
-        for doc_info in system_docs:
-            doc = Document(
-                page_content=f"Title: {doc_info['title']}\n\nContent: {doc_info['content']}",
-                metadata={
-                    "source": "System Documentation",
-                    "title": doc_info['title'],
-                    "category": doc_info['category'],
-                    "type": "system_doc"
-                }
-            )
-            documents.append(doc)
-
-        return documents
+        # Content is static, so the Document list is built once at import
+        return _SYSTEM_DOCUMENTS
 
     def _load_conversation_history(self):
         """Load successful conversation history for learning"""
         documents = []
 
         try:
-            # Get successful conversations from last 30 days
-            conversations = frappe.db.sql("""
-                SELECT DISTINCT c.name, c.title
-                FROM `tabChatbot Conversation` c
-                INNER JOIN `tabChatbot Message` m ON c.name = m.conversation
-                WHERE c.creation >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-                AND m.is_error = 0
-                GROUP BY c.name
-                HAVING COUNT(m.name) >= 4
-                LIMIT 50
-            """, as_dict=True)
+            # Get successful conversations from last 30 days - the
+            # denormalized message_count avoids the join + COUNT/HAVING
+            # aggregation over every message row
+            conversations = frappe.get_all(
+                "Chatbot Conversation",
+                fields=["name", "title"],
+                filters={
+                    "creation": [">=", frappe.utils.add_days(frappe.utils.today(), -30)],
+                    "message_count": [">=", 4]
+                },
+                limit=50
+            )
 
             for conv in conversations:
                 # Get messages from this conversation
@@ -487,18 +1078,18 @@ class SmartRAGRetriever:
         documents = []
 
         try:
-            # Get only recent successful conversations (last 10)
-            conversations = frappe.db.sql("""
-                SELECT DISTINCT c.name, c.title
-                FROM `tabChatbot Conversation` c
-                INNER JOIN `tabChatbot Message` m ON c.name = m.conversation
-                WHERE c.creation >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)
-                AND m.is_error = 0
-                GROUP BY c.name
-                HAVING COUNT(m.name) >= 4
-                ORDER BY c.modified DESC
-                LIMIT 10
-            """, as_dict=True)
+            # Get only recent successful conversations (last 10), filtered
+            # on the denormalized message_count instead of a COUNT+HAVING join
+            conversations = frappe.get_all(
+                "Chatbot Conversation",
+                fields=["name", "title"],
+                filters={
+                    "creation": [">=", frappe.utils.add_days(frappe.utils.today(), -7)],
+                    "message_count": [">=", 4]
+                },
+                order_by="modified desc",
+                limit=10
+            )
 
             for conv in conversations:
                 # Get messages from this conversation (limit to 10 messages)
@@ -550,19 +1141,30 @@ class SmartRAGRetriever:
                 # schema_filters = self.industry_handler.get_schema_filters()
 
         try:
-            for doctype_name in essential_doctypes:
-                if not frappe.db.exists("DocType", doctype_name):
-                    continue
-
-                # Get basic fields only
-                fields = frappe.get_all("DocField",
-                                    fields=["fieldname", "fieldtype", "label"],
-                                    filters={
-                                        "parent": doctype_name,
-                                        "fieldtype": ["in", ["Data", "Link", "Currency", "Float", "Int", "Date"]]
-                                    },
-                                    order_by="idx",
-                                    limit=15)
+            existing_doctypes = frappe.get_all(
+                "DocType",
+                filters={"name": ["in", essential_doctypes]},
+                pluck="name"
+            )
+
+            # One batched query for every doctype's fields instead of one
+            # round-trip per doctype; the 15-field cap is applied per
+            # parent while grouping
+            all_fields = frappe.get_all("DocField",
+                                fields=["parent", "fieldname", "fieldtype", "label"],
+                                filters={
+                                    "parent": ["in", existing_doctypes],
+                                    "fieldtype": ["in", ["Data", "Link", "Currency", "Float", "Int", "Date"]]
+                                },
+                                order_by="parent, idx")
+
+            fields_by_parent = collections.defaultdict(list)
+            for field in all_fields:
+                if len(fields_by_parent[field.parent]) < 15:
+                    fields_by_parent[field.parent].append(field)
+
+            for doctype_name in existing_doctypes:
+                fields = fields_by_parent[doctype_name]
 
                 # Create minimal schema documentation
                 schema_info = f"DocType: {doctype_name}\n"
@@ -587,83 +1189,36 @@ class SmartRAGRetriever:
 
     def _load_process_documentation(self):
         """Load business process documentation"""
-        documents = []
-
-        # Common business processes in Growth ERP
-        processes = [
-            {
-                "title": "Lead to Customer Conversion",
-                "content": """Lead to Customer conversion process:
-                1. Create Lead in CRM module
-                2. Qualify lead through follow-ups
-                3. Convert qualified lead to Opportunity
-                4. Create Quotation from Opportunity
-                5. Convert Quotation to Sales Order
-                6. Convert Customer from Lead when ready
-
-                Key reports: Lead Details, Conversion Rate, Sales Funnel""",
-                "category": "CRM Process"
-            },
-            {
-                "title": "Order to Cash Process",
-                "content": """Complete Order to Cash workflow:
-                1. Receive Sales Order from customer
-                2. Check item availability in stock
-                3. Create Delivery Note for shipment
-                4. Generate Sales Invoice for billing
-                5. Record Payment Entry when received
-                6. Update customer ledger
-
-                Key documents: Sales Order, Delivery Note, Sales Invoice, Payment Entry""",
-                "category": "Sales Process"
-            },
-            {
-                "title": "Procure to Pay Process",
-                "content": """Procurement to Payment workflow:
-                1. Create Material Request for requirements
-                2. Generate Purchase Order to supplier
-                3. Receive goods via Purchase Receipt
-                4. Verify Purchase Invoice from supplier
-                5. Make Payment Entry to supplier
-                6. Update supplier ledger
-
-                Key documents: Material Request, Purchase Order, Purchase Receipt, Purchase Invoice""",
-                "category": "Buying Process"
-            },
-            {
-                "title": "Inventory Management",
-                "content": """Stock management best practices:
-                1. Maintain accurate item masters
-                2. Set reorder levels for automatic procurement
-                3. Conduct regular stock reconciliation
-                4. Use batch/serial tracking for traceability
-                5. Monitor stock aging and movement
-                6. Implement ABC analysis for optimization
-
-                Key reports: Stock Balance, Stock Ledger, Stock Aging, Reorder Report""",
-                "category": "Stock Process"
-            }
-        ]
+        # Content is static, so the Document list is built once at import
+        return _PROCESS_DOCUMENTS
 
-        for process in processes:
-            doc = Document(
-                page_content=f"Process: {process['title']}\n\nDetails: {process['content']}",
-                metadata={
-                    "source": "Process Documentation",
-                    "title": process['title'],
-                    "category": process['category'],
-                    "type": "process_doc"
-                }
-            )
-            documents.append(doc)
+    def _code_cache_path(self):
+        """Return the on-disk path for the extracted-code cache
 
-        return documents
+        Built from site_path captured in __init__ - this runs in pool
+        worker threads where frappe.local is unbound, so it must not
+        call frappe.get_site_path itself.
+        """
+        return os.path.join(self.site_path, "private", "files", "gs_chat_rag_code_cache.json")
 
     def _load_code_files(self):
         """🚀 Load Python code files for system understanding"""
         documents = []
 
         try:
+            # Extraction results are cached on disk keyed by path + mtime,
+            # so unchanged files skip both the read and the AST parse on
+            # every hourly rebuild
+            cache_path = self._code_cache_path()
+            code_cache = {}
+            if os.path.exists(cache_path):
+                try:
+                    with open(cache_path, 'r') as f:
+                        code_cache = json.load(f)
+                except Exception:
+                    code_cache = {}
+            fresh_cache = {}
+
             # Define important code directories to scan
             code_dirs = [
                 os.path.join(self.app_path, "controllers"),
@@ -674,24 +1229,43 @@ class SmartRAGRetriever:
             for code_dir in code_dirs:
                 if os.path.exists(code_dir):
                     for root, dirs, files in os.walk(code_dir):
+                        # Prune vendored/build dirs in place so walk never
+                        # descends into them
+                        dirs[:] = [d for d in dirs if d not in _SKIP_DIRS]
+
                         for file in files:
                             if file.endswith(('.py', '.js')):
                                 file_path = os.path.join(root, file)
                                 try:
-                                    with open(file_path, 'r', encoding='utf-8') as f:
-                                        content = f.read()
-
-                                    # Skip very large files or binary content
-                                    if len(content) > 10000 or not content.strip():
+                                    # Size check via stat before reading -
+                                    # oversized files are skipped without
+                                    # pulling their bytes into memory
+                                    if os.path.getsize(file_path) > CODE_FILE_MAX_BYTES:
                                         continue
 
-                                    # Extract meaningful information from code
-                                    code_info = self._extract_code_information(content, file_path)
+                                    cache_key = f"{file_path}:{os.path.getmtime(file_path)}"
+                                    cached_chunks = code_cache.get(cache_key)
+                                    if isinstance(cached_chunks, list):
+                                        # Unchanged file - reuse the final
+                                        # chunks without reading, parsing or
+                                        # re-splitting
+                                        chunks = cached_chunks
+                                    else:
+                                        with open(file_path, 'r', encoding='utf-8') as f:
+                                            content = f.read()
+
+                                        if not content.strip():
+                                            continue
+
+                                        # Extract meaningful information from code
+                                        code_info = self._extract_code_information(content, file_path)
 
-                                    if code_info:
                                         # Split large code files into chunks
-                                        chunks = self.text_splitter.split_text(code_info)
+                                        chunks = self.text_splitter.split_text(code_info) if code_info else []
+
+                                    fresh_cache[cache_key] = chunks
 
+                                    if chunks:
                                         for i, chunk in enumerate(chunks):
                                             doc = Document(
                                                 page_content=chunk,
@@ -708,6 +1282,14 @@ class SmartRAGRetriever:
                                 except Exception as e:
                                     frappe.log_error(f"Error reading code file {file_path}: {str(e)}")
 
+            # Persist only keys seen this pass so deleted/modified files
+            # don't accumulate stale entries
+            try:
+                with open(cache_path, 'w') as f:
+                    json.dump(fresh_cache, f)
+            except Exception as e:
+                frappe.logger().error(f"Error writing code cache: {str(e)}")
+
         except Exception as e:
             frappe.log_error(f"Error loading code files: {str(e)}")
 
@@ -727,23 +1309,10 @@ class SmartRAGRetriever:
                 try:
                     tree = ast.parse(content)
 
-                    # Extract classes and their methods
-                    for node in ast.walk(tree):
-                        if isinstance(node, ast.ClassDef):
-                            info_parts.append(f"\nClass: {node.name}")
-                            if ast.get_docstring(node):
-                                info_parts.append(f"Description: {ast.get_docstring(node)}")
-
-                            # Extract methods
-                            methods = [n.name for n in node.body if isinstance(n, ast.FunctionDef)]
-                            if methods:
-                                info_parts.append(f"Methods: {', '.join(methods)}")
-
-                        elif isinstance(node, ast.FunctionDef) and node.col_offset == 0:
-                            # Top-level functions
-                            info_parts.append(f"\nFunction: {node.name}")
-                            if ast.get_docstring(node):
-                                info_parts.append(f"Description: {ast.get_docstring(node)}")
+                    # Single targeted pass over class/function definitions
+                    visitor = _CodeInfoVisitor()
+                    visitor.visit(tree)
+                    info_parts.extend(visitor.parts)
 
                 except SyntaxError:
                     # If AST parsing fails, include raw content (truncated)
@@ -788,12 +1357,17 @@ class SmartRAGRetriever:
                     )
                     all_doctypes.update(filtered_doctypes)
 
+                # One filtered query replaces a frappe.db.exists round-trip
+                # per doctype
+                existing_doctypes = set(frappe.get_all(
+                    "DocType",
+                    filters={"name": ["in", list(all_doctypes)]},
+                    pluck="name"
+                ))
+
                 # Load each doctype
-                for doctype_name in all_doctypes:
+                for doctype_name in existing_doctypes:
                     try:
-                        if not frappe.db.exists("DocType", doctype_name):
-                            continue
-
                         doctype = frappe.get_doc("DocType", doctype_name)
                         fields = doctype.fields
 
@@ -841,13 +1415,20 @@ class SmartRAGRetriever:
 
                 frappe.logger().info(f"Loading schema for {len(doctypes)} doctypes")
 
+                # Fetch every doctype's fields in one query and group in
+                # Python - avoids an N+1 round-trip per doctype
+                all_fields = frappe.get_all("DocField",
+                                    fields=["parent", "fieldname", "fieldtype", "label", "options"],
+                                    filters={"parent": ["in", [d.name for d in doctypes]]},
+                                    order_by="parent, idx")
+
+                fields_by_parent = collections.defaultdict(list)
+                for field in all_fields:
+                    fields_by_parent[field.parent].append(field)
+
                 for doctype in doctypes:
                     try:
-                        # Get doctype fields
-                        fields = frappe.get_all("DocField",
-                                            fields=["fieldname", "fieldtype", "label", "options"],
-                                            filters={"parent": doctype.name},
-                                            order_by="idx")
+                        fields = fields_by_parent[doctype.name]
 
                         # Create schema documentation
                         schema_info = f"DocType: {doctype.name}\n"
@@ -928,62 +1509,90 @@ class SmartRAGRetriever:
             doctype_dir = os.path.join(self.app_path, "gs_chat", "doctype")
 
             if os.path.exists(doctype_dir):
-                for root, dirs, files in os.walk(doctype_dir):
-                    for file in files:
-                        if file.endswith('.json') and not file.startswith('test_'):
-                            file_path = os.path.join(root, file)
-                            try:
-                                with open(file_path, 'r', encoding='utf-8') as f:
-                                    content = f.read()
-
-                                # Parse JSON to extract meaningful info
-                                try:
-                                    doctype_data = json.loads(content)
-
-                                    # Create readable documentation
-                                    doc_info = f"DocType Definition: {doctype_data.get('name', 'Unknown')}\n"
-                                    doc_info += f"Module: {doctype_data.get('module', 'Unknown')}\n"
-                                    doc_info += f"Engine: {doctype_data.get('engine', 'Unknown')}\n"
-
-                                    # Add field information
-                                    fields = doctype_data.get('fields', [])
-                                    if fields:
-                                        doc_info += "\nFields:\n"
-                                        for field in fields:
-                                            doc_info += f"- {field.get('fieldname', 'unknown')} ({field.get('fieldtype', 'unknown')}): {field.get('label', 'No label')}\n"
-
-                                    # Add permissions
-                                    permissions = doctype_data.get('permissions', [])
-                                    if permissions:
-                                        doc_info += "\nPermissions:\n"
-                                        for perm in permissions:
-                                            doc_info += f"- Role: {perm.get('role', 'Unknown')}, Read: {perm.get('read', 0)}, Write: {perm.get('write', 0)}\n"
-
-                                    doc = Document(
-                                        page_content=doc_info,
-                                        metadata={
-                                            "source": "DocType Definition",
-                                            "doctype": doctype_data.get('name', 'Unknown'),
-                                            "file_path": file_path,
-                                            "type": "doctype_def"
-                                        }
-                                    )
-                                    documents.append(doc)
-
-                                except json.JSONDecodeError:
-                                    # If JSON parsing fails, include raw content (truncated)
-                                    doc = Document(
-                                        page_content=f"DocType File: {file}\n\nContent (truncated):\n{content[:1000]}",
-                                        metadata={
-                                            "source": "DocType Definition",
-                                            "file_path": file_path,
-                                            "type": "doctype_def"
-                                        }
-                                    )
-                                    documents.append(doc)
-
-                            except Exception as e:
-                                frappe.log_error(f"Error reading doctype file {file_path}: {str(e)}")
+                # scandir answers is_dir/is_file from the dirent cache, so
+                # the walk avoids the extra stat per entry os.walk pays
+                def _iter_json(directory):
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            if entry.is_dir(follow_symlinks=False):
+                                yield from _iter_json(entry.path)
+                            elif (entry.is_file() and entry.name.endswith('.json')
+                                  and not entry.name.startswith('test_')):
+                                yield entry.path
+
+                json_paths = list(_iter_json(doctype_dir))
+
+                def _read_file(path):
+                    # Runs in a worker thread; errors are carried back so
+                    # logging stays on the request thread. Bytes are kept
+                    # raw - both JSON parsers accept them directly, so the
+                    # happy path never pays a str decode
+                    try:
+                        with open(path, 'rb') as f:
+                            return path, f.read(), None
+                    except Exception as e:
+                        return path, None, e
+
+                # Fan the file reads out; parsing and Document construction
+                # stay on this thread
+                with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+                    read_results = list(executor.map(_read_file, json_paths))
+
+                for file_path, content, read_error in read_results:
+                    file = os.path.basename(file_path)
+                    if read_error is not None:
+                        frappe.log_error(f"Error reading doctype file {file_path}: {str(read_error)}")
+                        continue
+
+                    # Parse JSON to extract meaningful info - orjson's SIMD
+                    # parser when installed, stdlib json otherwise
+                    try:
+                        doctype_data = orjson.loads(content) if orjson else json.loads(content)
+
+                        # Create readable documentation
+                        doc_info = f"DocType Definition: {doctype_data.get('name', 'Unknown')}\n"
+                        doc_info += f"Module: {doctype_data.get('module', 'Unknown')}\n"
+                        doc_info += f"Engine: {doctype_data.get('engine', 'Unknown')}\n"
+
+                        # Add field information
+                        fields = doctype_data.get('fields', [])
+                        if fields:
+                            doc_info += "\nFields:\n"
+                            for field in fields:
+                                doc_info += f"- {field.get('fieldname', 'unknown')} ({field.get('fieldtype', 'unknown')}): {field.get('label', 'No label')}\n"
+
+                        # Add permissions
+                        permissions = doctype_data.get('permissions', [])
+                        if permissions:
+                            doc_info += "\nPermissions:\n"
+                            for perm in permissions:
+                                doc_info += f"- Role: {perm.get('role', 'Unknown')}, Read: {perm.get('read', 0)}, Write: {perm.get('write', 0)}\n"
+
+                        doc = LightDoc(
+                            page_content=doc_info,
+                            metadata={
+                                "source": "DocType Definition",
+                                "doctype": doctype_data.get('name', 'Unknown'),
+                                "file_path": file_path,
+                                "type": "doctype_def"
+                            }
+                        )
+                        documents.append(doc)
+
+                    except ValueError:
+                        # Covers both json.JSONDecodeError and
+                        # orjson.JSONDecodeError - decode only the first 1000
+                        # bytes for the truncated fallback
+                        snippet = content[:1000].decode('utf-8', 'replace')
+                        doc = LightDoc(
+                            page_content=f"DocType File: {file}\n\nContent (truncated):\n{snippet}",
+                            metadata={
+                                "source": "DocType Definition",
+                                "file_path": file_path,
+                                "type": "doctype_def"
+                            }
+                        )
+                        documents.append(doc)
 
         except Exception as e:
             frappe.log_error(f"Error loading doctype definitions: {str(e)}")
@@ -995,19 +1604,16 @@ class SmartRAGRetriever:
         documents = []
 
         try:
-            # Only load essential sources in lightweight mode
-
-            # 1. System Documentation (most important)
-            system_docs = self._load_system_documentation()
-            documents.extend(system_docs)
-
-            # 2. Recent Conversation History (limited)
-            conversation_docs = self._load_conversation_history_limited()
-            documents.extend(conversation_docs)
-
-            # 3. Essential Database Schema (top 10 doctypes only)
-            schema_docs = self._load_essential_schema()
-            documents.extend(schema_docs)
+            # Only load essential sources in lightweight mode: system
+            # documentation, recent conversation history and the essential
+            # schema. Chained into the list in one pass - the intermediate
+            # per-loader lists are dropped as they are consumed instead of
+            # all coexisting alongside the combined list.
+            documents = list(itertools.chain(
+                self._load_system_documentation(),
+                self._load_conversation_history_limited(),
+                self._load_essential_schema(),
+            ))
 
             # Skip code files and configuration files in lightweight mode
 
@@ -1024,18 +1630,51 @@ class SmartRAGRetriever:
 
 
 
+def _build_vector_store(api_key, provider="OpenAI", base_url=None, enqueued_at=None):
+    """Background worker that rebuilds the shared vector store
+
+    Runs under the site-wide refresh lock so concurrent refresh requests
+    queue a single rebuild. A queued duplicate that acquires the lock
+    after another job already rebuilt checks the persisted index's mtime
+    against its own enqueue time and returns without redoing the work.
+    The rebuilt index is persisted to disk, where web workers pick it up
+    on their next cold load or TTL expiry.
+    """
+    try:
+        with frappe.cache().lock(f"gs_chat_rag_refresh_{frappe.local.site}", timeout=600):
+            rag_retriever = SmartRAGRetriever(api_key, provider, base_url)
+
+            # Two admins clicking refresh queue two jobs; the second one
+            # finds an index written after it was enqueued and must not
+            # delete that fresh work just to rebuild it identically
+            if enqueued_at:
+                index_path, _ = rag_retriever._index_paths()
+                if os.path.exists(index_path) and os.path.getmtime(index_path) > enqueued_at:
+                    frappe.logger().info("RAG index already rebuilt since this refresh was queued; skipping")
+                    return
+
+            with _rag_lock:
+                rag_cache["vector_store"] = None
+                rag_cache["embeddings"] = None
+                rag_cache["last_updated"] = None
+
+            rag_retriever._delete_persisted_index()
+            rag_retriever._get_or_create_vector_store()
+    except Exception as e:
+        frappe.log_error(f"Background RAG build failed: {str(e)}")
+
+
 @frappe.whitelist()
 def refresh_rag_knowledge_base():
-    """Manually refresh the RAG knowledge base"""
-    try:
-        global rag_cache
+    """Queue a background refresh of the RAG knowledge base
 
-        # Clear existing cache
-        rag_cache = {
-            "vector_store": None,
-            "embeddings": None,
-            "last_updated": None
-        }
+    The build scans the whole app and can take minutes, so it runs on the
+    long queue instead of blocking the whitelisted call. Queries fall back
+    to whatever store is currently loaded (or no-RAG mode) until the
+    rebuild lands.
+    """
+    try:
+        from gs_chat.controllers.chat import get_cached_settings
 
         # Get settings for API key
         settings = get_cached_settings()
@@ -1049,23 +1688,20 @@ def refresh_rag_knowledge_base():
                 "error": "API key not configured"
             }
 
-        # Create new RAG retriever and force refresh
-        rag_retriever = SmartRAGRetriever(api_key, provider, base_url)
-        vector_store = rag_retriever._get_or_create_vector_store()
+        frappe.enqueue(
+            "gs_chat.controllers.layers.rag_retriever._build_vector_store",
+            queue="long",
+            api_key=api_key,
+            provider=provider,
+            base_url=base_url,
+            enqueued_at=time.time()
+        )
 
-        if vector_store:
-            doc_count = vector_store.index.ntotal if hasattr(vector_store.index, 'ntotal') else "Unknown"
-            return {
-                "success": True,
-                "message": f"RAG knowledge base refreshed successfully",
-                "documents_indexed": doc_count,
-                "provider": provider
-            }
-        else:
-            return {
-                "success": False,
-                "error": "Failed to create vector store"
-            }
+        return {
+            "success": True,
+            "message": "RAG knowledge base refresh queued",
+            "provider": provider
+        }
 
     except Exception as e:
         frappe.log_error(f"Failed to refresh RAG knowledge base: {str(e)}")
@@ -7,6 +7,23 @@ import re
 import frappe
 from frappe import _
 
+try:
+    import sqlglot
+    from sqlglot import exp as sqlglot_exp
+except ImportError:
+    sqlglot = None
+
+# Expression nodes that must never appear in a validated query; resolved by
+# name so the tuple works across sqlglot versions
+_FORBIDDEN_SQL_NODES = tuple(
+    node for node in (
+        getattr(sqlglot_exp, name, None)
+        for name in ("Update", "Delete", "Drop", "Alter", "AlterTable",
+                     "TruncateTable", "Grant", "Command")
+    )
+    if node is not None
+) if sqlglot else ()
+
 class SQLValidator:
     """Validates SQL queries for safety and permissions"""
 
@@ -25,14 +42,35 @@ class SQLValidator:
         'DESCRIBE': 'read',
     }
 
-    # DocTypes allowed for INSERT operations
-    ALLOWED_INSERT_DOCTYPES = [
+    # DocTypes allowed for INSERT operations (frozenset for O(1) membership)
+    ALLOWED_INSERT_DOCTYPES = frozenset({
         'Lead', 'Opportunity', 'Customer', 'Supplier',
         'Item', 'Task', 'Event', 'Note'
-    ]
-
-    def __init__(self):
-        self.user = frappe.session.user
+    })
+
+    # System fields that must never be set through an AI-generated INSERT
+    _FORBIDDEN_FIELDS = frozenset({
+        'docstatus', 'idx', 'lft', 'rgt', '_user_tags', '_liked_by'
+    })
+
+    # Legitimate chat-generated queries never approach this; anything
+    # larger is rejected before any regex or parse work runs
+    MAX_QUERY_LEN = 8192
+
+    # Compiled once at class load with IGNORECASE baked in, so each
+    # validation is a regex pass instead of pattern re-hashing plus an
+    # uppercase copy of the query. The forbidden keywords collapse into
+    # one alternation so the fallback scan is a single pass.
+    _FORBIDDEN_RE = re.compile("|".join(FORBIDDEN_KEYWORDS), re.IGNORECASE)
+    _TABLE_RE = re.compile(r'(?:FROM|JOIN)\s+`?(\w+)`?', re.IGNORECASE)
+    _OUTFILE_RE = re.compile(r'INTO\s+OUTFILE', re.IGNORECASE)
+    _INSERT_TABLE_RE = re.compile(r'INTO\s+`?tab(\w+)`?', re.IGNORECASE)
+
+    @property
+    def user(self):
+        """Current session user, read lazily so the shared singleton never
+        carries stale per-request state"""
+        return frappe.session.user
 
     def validate_query(self, query, doctype=None):
         """
@@ -48,37 +86,59 @@ class SQLValidator:
         if not query:
             return False, "Empty query"
 
-        query_upper = query.upper().strip()
-
-        # Check for forbidden operations
-        for pattern in self.FORBIDDEN_KEYWORDS:
-            if re.search(pattern, query_upper, re.IGNORECASE):
-                return False, f"Forbidden operation detected: {pattern}"
+        if len(query) > self.MAX_QUERY_LEN:
+            return False, "Query too long"
+
+        # Parse once and walk the AST when sqlglot is available - one parse
+        # amortizes the operation, table and column checks and can't be
+        # fooled by comments or quoted strings the way a keyword scan can
+        tree = None
+        if sqlglot is not None:
+            try:
+                tree = sqlglot.parse_one(query, read='mysql')
+            except sqlglot.errors.ParseError:
+                return False, "Query could not be parsed"
+            if tree is None:
+                return False, "Query could not be parsed"
+
+            forbidden = tree.find(*_FORBIDDEN_SQL_NODES) if _FORBIDDEN_SQL_NODES else None
+            if forbidden is not None:
+                return False, f"Forbidden operation detected: {type(forbidden).__name__.upper()}"
+
+            operation = type(tree).__name__.upper()
+        else:
+            # Fallback: one keyword alternation scan on the raw text
+            match = self._FORBIDDEN_RE.search(query)
+            if match:
+                return False, f"Forbidden operation detected: {match.group(0)}"
 
-        # Determine operation type
-        operation = self._get_operation(query_upper)
+            operation = self._get_operation(query)
 
         if operation not in self.ALLOWED_OPERATIONS:
             return False, f"Operation '{operation}' is not allowed"
 
         # Handle based on operation type
         if operation == 'SELECT':
-            return self._validate_select(query, doctype)
+            return self._validate_select(query, doctype, tree)
         elif operation == 'INSERT':
-            return self._validate_insert(query, doctype)
+            return self._validate_insert(query, doctype, tree)
         else:
             # SHOW, DESCRIBE - generally safe
             return True, None
 
     def _get_operation(self, query):
-        """Extract the main operation from query"""
-        first_word = query.split()[0] if query.split() else ""
-        return first_word
+        """Extract the main operation from query
 
-    def _validate_select(self, query, doctype):
+        Upper-cases only the leading token instead of copying the whole
+        query, which matters for multi-KB statements.
+        """
+        head = query.lstrip()[:20].split(None, 1)
+        return head[0].upper() if head else ""
+
+    def _validate_select(self, query, doctype, tree=None):
         """Validate SELECT queries"""
         # Extract table names from query
-        tables = self._extract_tables(query)
+        tables = self._extract_tables(query, tree)
 
         # Check permissions for each table
         for table in tables:
@@ -87,18 +147,23 @@ class SQLValidator:
                 return False, f"No read permission for {doctype_name}"
 
         # Additional safety checks
-        if 'INTO OUTFILE' in query.upper():
+        if self._OUTFILE_RE.search(query):
             return False, "File operations not allowed"
 
         return True, None
 
-    def _validate_insert(self, query, doctype):
+    def _validate_insert(self, query, doctype, tree=None):
         """Validate INSERT queries - only for allowed doctypes"""
         if not doctype:
             # Try to extract from query
-            match = re.search(r'INTO\s+`?tab(\w+)`?', query, re.IGNORECASE)
-            if match:
-                doctype = match.group(1)
+            if tree is not None:
+                table = tree.find(sqlglot_exp.Table)
+                if table is not None and table.name.startswith('tab'):
+                    doctype = table.name[3:]
+            else:
+                match = self._INSERT_TABLE_RE.search(query)
+                if match:
+                    doctype = match.group(1)
 
         if not doctype:
             return False, "Cannot determine target doctype for INSERT"
@@ -110,29 +175,25 @@ class SQLValidator:
             return False, f"No create permission for {doctype}"
 
         # Ensure no system fields are being set
-        forbidden_fields = ['docstatus', 'idx', 'lft', 'rgt', '_user_tags', '_liked_by']
-        query_lower = query.lower()
-        for field in forbidden_fields:
-            if field in query_lower:
+        if tree is not None:
+            # Check actual identifiers from the parse tree, not raw text
+            names = {ident.name.lower() for ident in tree.find_all(sqlglot_exp.Identifier)}
+            for field in self._FORBIDDEN_FIELDS & names:
                 return False, f"Cannot set system field: {field}"
+        else:
+            query_lower = query.lower()
+            for field in self._FORBIDDEN_FIELDS:
+                if field in query_lower:
+                    return False, f"Cannot set system field: {field}"
 
         return True, None
 
-    def _extract_tables(self, query):
+    def _extract_tables(self, query, tree=None):
         """Extract table names from query"""
-        tables = set()
-
-        # Pattern for FROM and JOIN clauses
-        patterns = [
-            r'FROM\s+`?(\w+)`?',
-            r'JOIN\s+`?(\w+)`?',
-        ]
-
-        for pattern in patterns:
-            matches = re.findall(pattern, query, re.IGNORECASE)
-            tables.update(matches)
-
-        return tables
+        if tree is not None:
+            return {table.name for table in tree.find_all(sqlglot_exp.Table)}
+        # One alternation pass covers both FROM and JOIN clauses
+        return set(self._TABLE_RE.findall(query))
 
     def _table_to_doctype(self, table):
         """Convert table name to doctype"""
@@ -188,14 +249,12 @@ class SQLValidator:
                 "error": str(e)
             }
 
-# Singleton instance
-_validator = None
+# Singleton instance - the validator holds no per-request state, so one
+# shared instance is safe across all threads
+_validator = SQLValidator()
 
 def get_sql_validator():
     """Get singleton SQL validator instance"""
-    global _validator
-    if not _validator:
-        _validator = SQLValidator()
     return _validator
 
 @frappe.whitelist()
@@ -1,3 +1,5 @@
+import functools
+
 HOW_TO = """You are an intelligent ERP assistant specialized in helping users with Growth ERP and business software questions.
 
 🎯 SCOPE - ONLY answer questions related to:
@@ -278,5 +280,30 @@ Example response for record creation:
 "I can only perform read operations and create draft records in specific doctypes (Lead, Customer, Item, etc.). I cannot delete, update, or submit records for safety reasons. Would you like me to show you the data instead?"
 """
 
-# Append to existing SYSTEM_PROMPT
-SYSTEM_PROMPT = HOW_TO + DB_QUERY + RESPONSE_FORMAT + FEATURES + SQL_SAFETY_RULES
+# Ordered prompt sections - joined once for the default prompt, and on
+# demand (cached) for variants that drop sections
+SYSTEM_PROMPT_PARTS = (
+    ("how_to", HOW_TO),
+    ("db_query", DB_QUERY),
+    ("response_format", RESPONSE_FORMAT),
+    ("features", FEATURES),
+    ("sql_safety_rules", SQL_SAFETY_RULES),
+)
+
+SYSTEM_PROMPT = "".join(text for _name, text in SYSTEM_PROMPT_PARTS)
+
+# Pre-encoded form for callers shipping the prompt over HTTP - the text
+# is fixed, so there is no reason to UTF-8 encode ~6 KB per request
+SYSTEM_PROMPT_BYTES = SYSTEM_PROMPT.encode("utf-8")
+
+
+@functools.lru_cache(maxsize=32)
+def build_system_prompt(exclude=frozenset()):
+    """Join the prompt sections, skipping the named ones
+
+    Cached per exclusion set, so role-specific variants are assembled
+    once instead of re-concatenating the full text per request.
+    """
+    if not exclude:
+        return SYSTEM_PROMPT
+    return "".join(text for name, text in SYSTEM_PROMPT_PARTS if name not in exclude)
@@ -1,10 +1,207 @@
+import collections
+import functools
+import json
+import operator
 import re
 import frappe
-from frappe.utils.jinja import render_template as jinja_render
+from jinja2.sandbox import SandboxedEnvironment
 
+# One environment for all renders - sandboxed like frappe's own jenv so
+# LLM-emitted templates can't reach arbitrary attributes
+_JINJA_ENV = SandboxedEnvironment(autoescape=False, auto_reload=False)
 
-def render_template(template, query_results):
+# Fixed scan patterns compiled at module load; the hot path only calls
+# methods on these instead of re-parsing pattern strings per render.
+# _PLACEHOLDER_RE consumes both {{expr}} and {expr} brace styles;
+# _ARRAY_EXPR_RE classifies the inner expression as indexed access.
+_PLACEHOLDER_RE = re.compile(r'\{\{?\s*([^{}]+?)\s*\}\}?')
+_ARRAY_EXPR_RE = re.compile(r'(\w+)(?:\[|\.)(\d+)\]?\.(\w+)$')
+_VAR_RE = re.compile(r'\{\{?\s*([\w.]+)\s*\}?\}')
+_CANON_VAR_RE = re.compile(r'\{\{([\w.]+)\}\}')
+
+# Tokenizer: one pass yields either a complete loop block or a
+# placeholder; everything between matches is a static chunk emitted
+# verbatim at render time
+_TOKEN_RE = re.compile(
+    r'\{%\s*for\s+(\w+)\s+in\s+(\w+)\s*%\}(.*?)\{%\s*endfor\s*%\}'
+    r'|\{\{?\s*([^{}]+?)\s*\}\}?',
+    re.DOTALL
+)
+
+
+@functools.lru_cache(maxsize=512)
+def _jinja_template(template):
+    """Compile a template string once; repeat renders reuse the bytecode
+
+    The system prompts and response templates are a small stable set, so
+    the cache hit rate is high and the Jinja parse cost drops from
+    per-render to once per distinct template.
+    """
+    return _JINJA_ENV.from_string(template)
+
+
+@functools.lru_cache(maxsize=256)
+def _parse(template):
+    """Tokenize a template into static chunks and slot descriptors
+
+    Returns (statics, slots) where len(statics) == len(slots) + 1; the
+    render interleaves them and joins once, so no substitution ever
+    rewrites the full string. Cached by the template text - the prompt
+    set is stable, so repeat renders skip tokenization entirely. Tuples
+    keep the cached value immutable across callers.
+    """
+    statics = []
+    slots = []
+    pos = 0
+
+    for match in _TOKEN_RE.finditer(template):
+        statics.append(template[pos:match.start()])
+        if match.group(1) is not None:
+            # ('loop', var_name, collection_name, body, raw_text)
+            slots.append(('loop', match.group(1), match.group(2),
+                          match.group(3), match.group(0)))
+        else:
+            # ('expr', expression, raw_text)
+            slots.append(('expr', match.group(4), match.group(0)))
+        pos = match.end()
+
+    statics.append(template[pos:])
+    return tuple(statics), tuple(slots)
+
+
+def _s(value):
+    """Stringify only when needed - many result fields arrive as str
+    already, and skipping the PyObject_Str dispatch adds up over wide
+    renders"""
+    return value if type(value) is str else str(value)
+
+
+def _resolve_expr(expr, query_results):
+    """Resolve key[0].field / key / key.field against query_results
+
+    Returns the substitution string, or None when the expression can't
+    be resolved (the caller then leaves the original text in place).
+    """
+    # Array/index access: key[0].field or key.0.field
+    array_match = _ARRAY_EXPR_RE.fullmatch(expr)
+    if array_match:
+        key, index, field = array_match.group(1), int(array_match.group(2)), array_match.group(3)
+        value = query_results.get(key)
+        if isinstance(value, list) and index < len(value) and field in value[index]:
+            return _s(value[index][field])
+        return None
+
+    parts = expr.split('.')
+
+    if len(parts) == 1:
+        # Simple placeholder like {{key}}
+        key = parts[0]
+        if key in query_results:
+            value = query_results[key]
+            if isinstance(value, list) and value:
+                first = value[0]
+                if isinstance(first, dict) and first.get(key):
+                    return _s(first.get(key))
+                return _s(first)
+            return _s(value)
+
+    elif len(parts) == 2 and '[' not in parts[0]:
+        # Nested placeholder like {{key.field}}
+        key, field = parts[0], parts[1]
+        value = query_results.get(key)
+        if isinstance(value, list) and value and field in value[0]:
+            return _s(value[0][field])
+
+    return None
+
+
+def _sub_placeholders(text, query_results):
+    """Resolve placeholders in a text fragment, leaving misses untouched"""
+    def _cb(match):
+        value = _resolve_expr(match.group(1), query_results)
+        return match.group(0) if value is None else value
+    return _PLACEHOLDER_RE.sub(_cb, text)
+
+
+def _render_loop(var_name, collection_name, block_content, query_results):
+    """Render one {% for %} block; None when the collection is missing"""
+    # Direct match, then a case-insensitive probe - both O(1); the
+    # substring scan only runs when the LLM named the collection loosely
+    collection = query_results.get(collection_name)
+    if collection is None:
+        lowered = {key.lower(): key for key in query_results}
+        exact_key = lowered.get(collection_name.lower())
+        if exact_key is not None:
+            collection = query_results[exact_key]
+        else:
+            # Fuzzy match as a last resort
+            for key in query_results:
+                if collection_name in key or key in collection_name:
+                    collection = query_results[key]
+                    break
+
+    if not (collection and isinstance(collection, list)):
+        return None
+
+    # Placeholders that don't reference the loop variable resolve the
+    # same for every row, so substitute them once up front
+    block_content = _sub_placeholders(block_content, query_results)
+
+    # Canonicalize spaced/single-brace variable forms to {{ref}} in one
+    # pass, then classify the references - both depend only on the
+    # template body, so none of it repeats per row
+    block_content = _VAR_RE.sub(r'{{\g<1>}}', block_content)
+
+    # Pre-split the canonical body into static chunks and slots; rows
+    # then only append values and join, instead of copying and rewriting
+    # the whole body per row
+    statics = []
+    slots = []  # ('field', getter, token) | ('index', -, -) | ('raw', -, token)
+    pos = 0
+    for match in _CANON_VAR_RE.finditer(block_content):
+        statics.append(block_content[pos:match.start()])
+        var_parts = match.group(1).split('.')
+        if var_parts[0] == var_name and len(var_parts) > 1:
+            # itemgetter is one C-level access per row instead of a
+            # containment check plus a second lookup
+            slots.append(('field', operator.itemgetter(var_parts[1]), match.group(0)))
+        elif var_parts[0] == "loop" and len(var_parts) > 1 and var_parts[1] == "index":
+            # The leading newline is constant, so it lives in the static
+            # chunk; rows only format the number itself
+            statics[-1] += "\n"
+            slots.append(('index', None, None))
+        else:
+            slots.append(('raw', None, match.group(0)))
+        pos = match.end()
+    statics.append(block_content[pos:])
+
+    rendered_items = []
+    for i, item in enumerate(collection):
+        pieces = []
+        for static, (kind, getter, token) in zip(statics, slots):
+            pieces.append(static)
+            if kind == 'field':
+                try:
+                    pieces.append(_s(getter(item)))
+                except KeyError:
+                    pieces.append(token)
+            elif kind == 'index':
+                pieces.append(str(i + 1))
+            else:
+                pieces.append(token)
+        pieces.append(statics[-1])
+        rendered_items.append("".join(pieces))
+
+    return "".join(rendered_items)
+
+
+# Rendering is deterministic in (template, query_results), so repeated
+# chat turns over cached query data short-circuit to a dict lookup
+_RENDER_CACHE = collections.OrderedDict()
+_RENDER_CACHE_MAX = 512
 
+
+def render_template(template, query_results):
     """
     Render a template with query results
 
@@ -15,121 +212,50 @@ def render_template(template, query_results):
     Returns:
         Rendered template
     """
-    import re
-
-    template = jinja_render(template, query_results)
-
-    result = template
-
-    # Handle array/index access like {{key[0].field}} or {{ key[0].field }}
-    # Pattern matches: {{ key[index].field }} with optional spaces
-    array_pattern = r'\{\{?\s*(\w+)(\[|\.)(\d+)\]?\.(\w+)\s*\}?\}'
-    array_matches = re.findall(array_pattern, result)
-
-    for key, _in, index, field in array_matches:
-        index = int(index)
-        if key in query_results and isinstance(query_results[key], list):
-            if index < len(query_results[key]) and field in query_results[key][index]:
-                value = str(query_results[key][index][field])
-
-                # Replace with spaces preserved
-                if _in == "[":
-                    varformat = r'\{\{?\s*' + key + r'\[' + str(index) + r'\]\.' + field + r'\s*\}?\}'
-                else:
-                    varformat = r'\{\{?\s*' + key + r'\.' + str(index) + r'\.' + field + r'\s*\}?\}'
-
-                result = re.sub(
-                    varformat,
-                    value,
-                    result
-                )
-
-    # Handle simple placeholders {{key.field}} with optional spaces
-    simple_pattern = r'\{\s*([^{}]+)\s*\}'
-    simple_placeholders = re.findall(simple_pattern, result)
-
-    for placeholder in simple_placeholders:
-        placeholder = placeholder.strip()
-        parts = placeholder.split('.')
-
-        if len(parts) == 1:
-            # Simple placeholder like {{key}}
-            key = parts[0]
-            if key in query_results:
-                if isinstance(query_results[key], list) and query_results[key]:
-                    value = query_results[key][0]
-
-                    if isinstance(value, dict) and value.get(key):
-                        value = str(value.get(key))
-                    else:
-                        value = str(value)
-                else:
-                    value = str(query_results[key])
-
-                # Replace with spaces
-                result = re.sub(r'\{\s*' + re.escape(placeholder) + r'\s*\}', value, result)
-
-        elif len(parts) == 2 and '[' not in parts[0]:
-            # Nested placeholder like {{key.field}}
-            key, field = parts[0], parts[1]
-
-            if key in query_results and isinstance(query_results[key], list) and query_results[key]:
-                if field in query_results[key][0]:
-                    value = str(query_results[key][0][field])
-                    result = re.sub(r'\{\{?\s*' + re.escape(placeholder) + r'\s*\}\}?', value, result)
-
-    # Handle loop templates {% for item in items %}...{% endfor %}
-    loop_pattern = r'\{%\s*for\s+(\w+)\s+in\s+(\w+)\s*%\}(.*?)\{%\s*endfor\s*%\}'
-    loop_blocks = re.findall(loop_pattern, result, re.DOTALL)
-
-    for var_name, collection_name, block_content in loop_blocks:
-        collection = None
-        # Direct match
-        if collection_name in query_results:
-            collection = query_results[collection_name]
+    try:
+        key = (template, json.dumps(query_results, sort_keys=True, default=str))
+    except (TypeError, ValueError):
+        return _render(template, query_results)
+
+    cached = _RENDER_CACHE.get(key)
+    if cached is not None:
+        _RENDER_CACHE.move_to_end(key)
+        return cached
+
+    output = _render(template, query_results)
+    _RENDER_CACHE[key] = output
+    if len(_RENDER_CACHE) > _RENDER_CACHE_MAX:
+        _RENDER_CACHE.popitem(last=False)
+    return output
+
+
+def _render(template, query_results):
+    # FORMAT 2 responses are plain text with no markers at all; one
+    # C-level substring scan skips the Jinja render and tokenizer.
+    # Every placeholder and loop form starts with a brace, including the
+    # loose single-brace syntax, so this one check covers them all.
+    if '{' not in template:
+        return template
+
+    rendered = _jinja_template(template).render(**query_results)
+
+    statics, slots = _parse(rendered)
+    if not slots:
+        return rendered
+
+    # Emit-as-you-go: interleave static chunks with resolved slot values
+    # and join once, instead of rewriting the whole string per match
+    pieces = [statics[0]]
+    for i, slot in enumerate(slots):
+        if slot[0] == 'expr':
+            value = _resolve_expr(slot[1], query_results)
+            pieces.append(slot[2] if value is None else value)
         else:
-            # Fuzzy match
-            for key in query_results:
-                if collection_name in key or key in collection_name:
-                    collection = query_results[key]
-                    break
+            loop_output = _render_loop(slot[1], slot[2], slot[3], query_results)
+            if loop_output is None:
+                # Collection missing - keep the block, placeholders resolved
+                loop_output = _sub_placeholders(slot[4], query_results)
+            pieces.append(loop_output)
+        pieces.append(statics[i + 1])
 
-        if collection and isinstance(collection, list):
-            rendered_items = []
-            for i, item in enumerate(collection):
-                item_result = block_content
-
-                # Replace {{var.field}} with spaces
-                var_pattern = r'\{\{?\s*([\w.]+)\s*\}?\}'
-                var_matches = re.findall(var_pattern, block_content)
-
-                for var_ref in var_matches:
-                    var_parts = var_ref.split('.')
-
-                    if var_parts[0] == var_name and len(var_parts) > 1:
-                        field = var_parts[1]
-                        if field in item:
-                            value = str(item[field])
-                            item_result = re.sub(
-                                r'\{\{\s*' + re.escape(var_ref) + r'\s*\}\}',
-                                value,
-                                item_result
-                            )
-                    elif var_parts[0] == "loop" and len(var_parts) > 1:
-                        if var_parts[1] == "index":
-                            item_result = re.sub(
-                                r'\{\{?\s*' + re.escape(var_ref) + r'\s*\}?\}',
-                                f"\n{str(i + 1)}",
-                                item_result
-                            )
-
-                rendered_items.append(item_result)
-                # if len(collection) == len(rendered_items):
-                #     rendered_items.append("\n")
-
-            # Replace the entire loop block
-            full_pattern = r'\{%\s*for\s+' + var_name + r'\s+in\s+' + collection_name + r'\s*%\}.*?\{%\s*endfor\s*%\}'
-            result = re.sub(full_pattern, "".join(rendered_items), result, flags=re.DOTALL)
-
-
-    return result
+    return "".join(pieces)
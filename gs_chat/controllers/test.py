@@ -1,7 +1,12 @@
+import asyncio
+import collections
+import functools
+import hashlib
+import itertools
+import json
+import re
 import frappe
-from langchain.chat_models import ChatOpenAI
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
+from langchain_openai import ChatOpenAI
 
 # This template helps convert natural language into SQL queries
 template = """
@@ -11,39 +16,137 @@ Question: {question}
 SQL Query:
 """
 
-prompt = PromptTemplate(
-    input_variables=["question"],
-    template=template.strip()
-)
+# Stripped once; per-call formatting is a single str.format
+_PROMPT = template.strip()
 
-# Get settings for API configuration
-settings = frappe.get_doc("Chatbot Settings")
-api_key = settings.get("api_key")
-provider = settings.get("provider") or "OpenAI"
-base_url = settings.get("base_url") if provider == "DeepSeek" else None
 
-# Create LLM instance with provider-specific configuration
-llm_kwargs = {
-    "temperature": 0,
-    "openai_api_key": api_key
-}
+def _render_prompt(question):
+    return _PROMPT.format(question=question)
 
-# Add base_url for DeepSeek
-if provider == "DeepSeek" and base_url:
-    llm_kwargs["base_url"] = base_url
 
-llm = ChatOpenAI(**llm_kwargs)
-chain = LLMChain(llm=llm, prompt=prompt)
+@functools.lru_cache(maxsize=1)
+def _get_llm():
+    """Build the LLM client on first use
+
+    Constructing the client needs a Chatbot Settings read and an HTTP
+    client; building it at import made every worker pay that cost
+    whether or not generate_sql ever ran.
+    """
+    settings = frappe.get_doc("Chatbot Settings")
+    api_key = settings.get("api_key")
+    provider = settings.get("provider") or "OpenAI"
+    base_url = settings.get("base_url") if provider == "DeepSeek" else None
+
+    llm_kwargs = {
+        "temperature": 0,
+        "openai_api_key": api_key
+    }
+
+    # Add base_url for DeepSeek
+    if provider == "DeepSeek" and base_url:
+        llm_kwargs["base_url"] = base_url
+
+    return ChatOpenAI(**llm_kwargs)
+
+
+@frappe.whitelist()
+def clear_chain_cache():
+    """Drop the cached LLM client so settings edits apply without a restart"""
+    _get_llm.cache_clear()
+    return {"success": True}
+
+
+# Identical questions repeat across dashboards and evals; caching the
+# generated SQL elides the network round-trip entirely. The cache is
+# keyed by the normalized question so trivial variants share a slot,
+# but the LLM always receives the original text - lowercasing it
+# degrades the casing of entity names and literals in the SQL.
+SQL_CACHE_TTL = 3600
+_WS_RE = re.compile(r"\s+")
+_SQL_CACHE = collections.OrderedDict()
+_SQL_CACHE_MAX = 512
+
+
+def _normalize(question):
+    """Collapse whitespace and case - used only to form the cache key"""
+    return _WS_RE.sub(" ", question.strip().lower())
+
 
 @frappe.whitelist()
 def generate_sql(question: str) -> str:
-    return chain.run({"question": question})
+    norm_question = _normalize(question)
+
+    sql = _SQL_CACHE.get(norm_question)
+    if sql is not None:
+        _SQL_CACHE.move_to_end(norm_question)
+        return sql
+
+    # Second tier in redis so the cache survives worker recycles
+    cache_key = f"gs_chat_sql:{hashlib.blake2b(norm_question.encode(), digest_size=16).hexdigest()}"
+    sql = frappe.cache().get_value(cache_key)
+    if not sql:
+        sql = _get_llm().invoke(_render_prompt(question)).content.strip()
+        frappe.cache().set_value(cache_key, sql, expires_in_sec=SQL_CACHE_TTL)
+
+    _SQL_CACHE[norm_question] = sql
+    if len(_SQL_CACHE) > _SQL_CACHE_MAX:
+        _SQL_CACHE.popitem(last=False)
+    return sql
+
+# Cap on rows returned per query; callers render at most a page, so
+# materializing an unbounded aggregate result wastes memory
+SQL_RESULT_MAX_ROWS = 500
+
 
 @frappe.whitelist()
-def get_sql_answer(question: str) -> str:
+def get_sql_answer(question: str):
     sql_query = generate_sql(question)
 
-    return frappe.db.sql(sql_query)
+    try:
+        # Server-side cursor when the frappe version supports it, so
+        # rows stream instead of materializing the full result set
+        cursor = frappe.db.sql(sql_query, as_iterator=True)
+    except TypeError:
+        cursor = iter(frappe.db.sql(sql_query))
+
+    rows = list(itertools.islice(cursor, SQL_RESULT_MAX_ROWS))
+    # One extra fetch tells us whether the cap actually cut anything
+    truncated = next(cursor, None) is not None
+    return {"rows": rows, "truncated": truncated}
+
+
+# How many LLM calls to keep in flight for a batch - bounded so a large
+# batch doesn't trip provider rate limits
+SQL_BATCH_CONCURRENCY = 10
+
+
+@frappe.whitelist()
+def get_sql_answers(questions):
+    """Generate and execute SQL for a batch of questions
+
+    The LLM calls are network-bound and run concurrently under a
+    semaphore; the queries then execute on this thread, since frappe's
+    DB connection is bound to frappe.local and must not be shared with
+    worker threads.
+    """
+    if isinstance(questions, str):
+        questions = json.loads(questions)
+
+    async def _generate_all():
+        llm = _get_llm()
+        semaphore = asyncio.Semaphore(SQL_BATCH_CONCURRENCY)
+
+        async def _one(question):
+            async with semaphore:
+                response = await llm.ainvoke(_render_prompt(question))
+                return response.content.strip()
+
+        # gather preserves argument order, keeping each SQL aligned
+        # with its question
+        return await asyncio.gather(*[_one(q) for q in questions])
+
+    sql_queries = asyncio.run(_generate_all())
+    return [(sql, frappe.db.sql(sql)) for sql in sql_queries]
 
 # from langchain.chat_models import ChatOpenAI
 # from langchain.prompts import PromptTemplate
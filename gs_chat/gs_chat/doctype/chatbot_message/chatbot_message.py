@@ -1,9 +1,23 @@
 # Copyright (c) 2025, GWS and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
 
 class ChatbotMessage(Document):
-	pass
+	def after_insert(self):
+		"""Keep the denormalized message_count on the parent conversation current"""
+		if not self.is_error:
+			frappe.db.sql(
+				"""UPDATE `tabChatbot Conversation`
+				SET message_count = message_count + 1
+				WHERE name = %s""",
+				(self.conversation,)
+			)
+
+
+def on_doctype_update():
+	"""Add composite indexes backing the hot conversation filters"""
+	frappe.db.add_index("Chatbot Message", ["conversation", "creation"])
+	frappe.db.add_index("Chatbot Message", ["conversation", "message_type"])
@@ -2,9 +2,17 @@
 GS Chat Memory DocType module
 """
 
+import json
+from functools import cached_property
+
 import frappe
 from frappe.model.document import Document
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 class GSChatMemory(Document):
     """
     GS Chat Memory document class
@@ -29,3 +37,78 @@ class GSChatMemory(Document):
         """
         if not self.timestamp:
             self.timestamp = frappe.utils.now()
+
+    @cached_property
+    def decoded_metadata(self):
+        """
+        Metadata parsed once per document instance
+
+        Consumers repeatedly json.loads the metadata field on hot read
+        paths; this memoizes the decode (orjson when installed) so each
+        loaded document pays it at most once.
+        """
+        if not self.metadata:
+            return {}
+        try:
+            return orjson.loads(self.metadata) if orjson else json.loads(self.metadata)
+        except ValueError:
+            return {}
+
+
+def add_interactions_bulk(user, interactions):
+    """
+    Insert many interaction records with one multi-row INSERT
+
+    Chat turns often arrive in bursts; inserting each through get_doc
+    plus save costs a round-trip and full document lifecycle per row.
+    This validates the rows in Python (mirroring GSChatMemory.validate
+    for interactions) and writes them in a single bulk_insert.
+
+    Args:
+        user: Owner of the interaction records
+        interactions: Iterable of (query, response, metadata) tuples;
+            metadata may be None or a dict
+
+    Returns:
+        List of generated record names, in input order
+    """
+    timestamp = frappe.utils.now()
+    # Standard document metadata so the rows behave like normal inserts
+    # (creation-ordered listings, ownership filters)
+    session_user = frappe.session.user
+    rows = []
+    for query, response, metadata in interactions:
+        if not (query or response):
+            frappe.throw("Query or response is required for interaction records")
+
+        if metadata is not None and not isinstance(metadata, str):
+            metadata = (
+                orjson.dumps(metadata).decode() if orjson else json.dumps(metadata)
+            )
+
+        rows.append((
+            frappe.generate_hash(length=10),
+            session_user,
+            timestamp,
+            timestamp,
+            session_user,
+            user,
+            query,
+            response,
+            metadata,
+            timestamp,
+            0,
+        ))
+
+    if rows:
+        frappe.db.bulk_insert(
+            "GS Chat Memory",
+            fields=[
+                "name", "owner", "creation", "modified", "modified_by",
+                "user", "query", "response", "metadata", "timestamp", "is_summary",
+            ],
+            values=rows,
+            ignore_duplicates=True,
+        )
+
+    return [row[0] for row in rows]
@@ -0,0 +1,12 @@
+import frappe
+
+
+def execute():
+    """Add composite indexes for the hot Chatbot Message filters
+
+    get_conversation_messages orders by (conversation, creation) and
+    save_message counts by (conversation, message_type); both ran on
+    Frappe's default single-column indexes.
+    """
+    frappe.db.add_index("Chatbot Message", ["conversation", "creation"])
+    frappe.db.add_index("Chatbot Message", ["conversation", "message_type"])
@@ -0,0 +1,11 @@
+import frappe
+
+
+def execute():
+    """Add a composite index for recent-interaction reads on GS Chat Memory
+
+    Recency queries filter by (user, is_summary) and order by timestamp;
+    Frappe's default single-column indexes force a filesort over every
+    row the user has.
+    """
+    frappe.db.add_index("GS Chat Memory", ["user", "is_summary", "timestamp"])
@@ -0,0 +1,18 @@
+import frappe
+
+
+def execute():
+    """Populate the denormalized message_count on existing conversations
+
+    The RAG conversation loader filters on message_count >= 4 instead of
+    a COUNT+HAVING join; new messages maintain the counter via the
+    Chatbot Message after_insert hook.
+    """
+    frappe.db.sql("""
+        UPDATE `tabChatbot Conversation` c
+        SET c.message_count = (
+            SELECT COUNT(*)
+            FROM `tabChatbot Message` m
+            WHERE m.conversation = c.name AND m.is_error = 0
+        )
+    """)
@@ -4,10 +4,25 @@ Test script for Smart RAG system - Dry run validation
 """
 
 import frappe
+import functools
 import json
 import time
 from unittest.mock import Mock, patch
 
+
+@functools.lru_cache(maxsize=8)
+def _retriever(api_key, provider, lightweight_mode=None):
+    """Share one retriever per configuration across test functions
+
+    Construction reloads the knowledge base from disk; caching by
+    (api_key, provider, lightweight_mode) means the corpus loads once
+    for the whole dry run. The None default preserves the constructor's
+    auto-detection, matching the direct constructions these calls
+    replaced.
+    """
+    from gs_chat.controllers.chat import SmartRAGRetriever
+    return SmartRAGRetriever(api_key, provider, lightweight_mode=lightweight_mode)
+
 def test_imports():
     """Test all required imports"""
     print("🔍 Testing imports...")
@@ -39,10 +54,8 @@ def test_lightweight_detection():
     print("\n🔍 Testing lightweight mode detection...")
     
     try:
-        from gs_chat.controllers.chat import SmartRAGRetriever
-        
         # Test with mock API key
-        retriever = SmartRAGRetriever("test-key", "OpenAI")
+        retriever = _retriever("test-key", "OpenAI")
         
         print(f"✅ Lightweight mode: {retriever.lightweight_mode}")
         print(f"✅ Embeddings initialized: {retriever.embeddings is not None}")
@@ -57,9 +70,7 @@ def test_knowledge_base_loading():
     print("\n🔍 Testing knowledge base loading...")
     
     try:
-        from gs_chat.controllers.chat import SmartRAGRetriever
-        
-        retriever = SmartRAGRetriever("test-key", "OpenAI", lightweight_mode=True)
+        retriever = _retriever("test-key", "OpenAI", lightweight_mode=True)
         
         # Test lightweight knowledge base
         docs = retriever._load_lightweight_knowledge_base()
@@ -79,9 +90,7 @@ def test_lightweight_search():
     print("\n🔍 Testing lightweight search...")
     
     try:
-        from gs_chat.controllers.chat import SmartRAGRetriever
-        
-        retriever = SmartRAGRetriever("test-key", "OpenAI", lightweight_mode=True)
+        retriever = _retriever("test-key", "OpenAI", lightweight_mode=True)
         
         # Test search
         results = retriever.get_relevant_documents("sales invoice", top_k=3)
@@ -135,17 +144,15 @@ def test_error_handling():
     print("\n🔍 Testing error handling...")
     
     try:
-        from gs_chat.controllers.chat import SmartRAGRetriever
-        
         # Test with invalid API key
-        retriever = SmartRAGRetriever("", "OpenAI")
+        retriever = _retriever("", "OpenAI")
         
         # This should not crash
         results = retriever.get_relevant_documents("test query")
         print(f"✅ Handled empty API key gracefully: {len(results)} results")
         
         # Test with invalid provider
-        retriever2 = SmartRAGRetriever("test-key", "InvalidProvider")
+        retriever2 = _retriever("test-key", "InvalidProvider")
         results2 = retriever2.get_relevant_documents("test query")
         print(f"✅ Handled invalid provider gracefully: {len(results2)} results")
         
@@ -154,6 +161,26 @@ def test_error_handling():
         print(f"❌ Error handling test failed: {e}")
         return False
 
+def test_batch_processing():
+    """Test the batched process_messages entrypoint"""
+    print("\n🔍 Testing batch processing...")
+
+    try:
+        from gs_chat.controllers.chat import process_messages
+        print("✅ process_messages function accessible")
+
+        # Empty batch short-circuits before settings or network access
+        result = process_messages([])
+        if result.get("success"):
+            print("❌ Empty batch should not succeed")
+            return False
+        print("✅ Empty batch rejected gracefully")
+
+        return True
+    except Exception as e:
+        print(f"❌ Batch processing test error: {e}")
+        return False
+
 def test_performance():
     """Test performance characteristics"""
     print("\n🔍 Testing performance...")
@@ -183,6 +210,9 @@ def run_all_tests():
     print("🚀 Starting Smart RAG System Dry Run Tests")
     print("=" * 50)
     
+    # Serial on purpose: retriever construction and the knowledge-base
+    # loaders resolve paths and data through frappe.local, which is
+    # bound to this thread only - pool workers would crash every test
     tests = [
         test_imports,
         test_lightweight_detection,
@@ -190,12 +220,13 @@ def run_all_tests():
         test_lightweight_search,
         test_process_message_integration,
         test_error_handling,
+        test_batch_processing,
         test_performance
     ]
-    
+
     passed = 0
     total = len(tests)
-    
+
     for test in tests:
         try:
             if test():
@@ -4,11 +4,21 @@ import json
 from gs_chat.controllers.conversation_memory import ConversationMemory, get_memory_manager
 
 class TestConversationMemory(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # One filtered cleanup for the whole class - transactional (no
+        # implicit COMMIT, unlike TRUNCATE) and scoped to the test
+        # user's rows, so other data on the site is untouched
+        frappe.db.delete("GS Chat Memory", {"user": "Administrator"})
+
     def setUp(self):
         self.memory = ConversationMemory("Administrator")
-        
-        # Clean up any existing test data
-        frappe.db.delete("GS Chat Memory", {"user": "Administrator"})
+
+        # Per-test isolation: roll back to a savepoint instead of
+        # re-deleting rows
+        frappe.db.savepoint("test_conversation_memory")
+        self.addCleanup(frappe.db.rollback, save_point="test_conversation_memory")
     
     def test_add_interaction(self):
         """Test adding an interaction to memory"""
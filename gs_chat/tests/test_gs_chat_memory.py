@@ -0,0 +1,39 @@
+import unittest
+import frappe
+from gs_chat.gs_chat.doctype.gs_chat_memory.gs_chat_memory import add_interactions_bulk
+
+class TestGSChatMemory(unittest.TestCase):
+    def setUp(self):
+        # Per-test isolation: roll back to a savepoint instead of
+        # deleting rows
+        frappe.db.savepoint("test_gs_chat_memory")
+        self.addCleanup(frappe.db.rollback, save_point="test_gs_chat_memory")
+
+    def test_add_interactions_bulk(self):
+        """Test bulk interaction insertion"""
+        # Skip if not in Frappe environment
+        if not hasattr(frappe, 'get_doc'):
+            self.skipTest("Frappe environment not available")
+
+        names = add_interactions_bulk("Administrator", [
+            ("Bulk query 1", "Bulk response 1", {"batch": 1}),
+            ("Bulk query 2", "Bulk response 2", None),
+            ("Bulk query 3", "Bulk response 3", {"batch": 3}),
+        ])
+
+        self.assertEqual(len(names), 3)
+
+        # Rows land with the same shape a per-doc insert would produce
+        memory_doc = frappe.get_doc("GS Chat Memory", names[0])
+        self.assertEqual(memory_doc.user, "Administrator")
+        self.assertEqual(memory_doc.owner, frappe.session.user)
+        self.assertIsNotNone(memory_doc.creation)
+        self.assertEqual(memory_doc.query, "Bulk query 1")
+        self.assertEqual(memory_doc.decoded_metadata.get("batch"), 1)
+
+        # Rows without query and response are rejected before the INSERT
+        with self.assertRaises(frappe.ValidationError):
+            add_interactions_bulk("Administrator", [(None, None, None)])
+
+if __name__ == "__main__":
+    unittest.main()
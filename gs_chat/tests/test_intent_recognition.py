@@ -4,10 +4,37 @@ import json
 from gs_chat.controllers.intent_recognition import IntentRecognizer, recognize_intent
 from gs_chat.controllers.intent_data import INTENT_CATEGORIES
 
+# Table-driven cases: each (query, intent) pair reports as its own
+# subTest, so a single bad query is pinpointed in the report instead
+# of aborting a loop
+INTENT_CASES = [
+    ("Show me information about customer ABC Corp", "get_customer_info"),
+    ("Get details for client XYZ Inc", "get_customer_info"),
+    ("Who is customer John Smith", "get_customer_info"),
+    ("Display customer information for Global Traders", "get_customer_info"),
+    ("Show me invoice INV-001", "check_invoice"),
+    ("Check the status of invoice INV-2023-05", "check_invoice"),
+    ("What's the status of bill #B12345", "check_invoice"),
+    ("Find invoice number INV-2023-001", "check_invoice"),
+    ("Help me with creating an invoice", "help"),
+    ("I need assistance with inventory management", "help"),
+    ("Guide me on how to update customer information", "help"),
+    ("Help with sales order process", "help"),
+]
+
+
 class TestIntentRecognition(unittest.TestCase):
     def setUp(self):
         self.recognizer = IntentRecognizer()
-    
+
+    def test_intent_cases(self):
+        """Each query resolves to its expected intent with confidence"""
+        for query, intent in INTENT_CASES:
+            with self.subTest(query=query):
+                result = self.recognizer.recognize_intent(query)
+                self.assertEqual(result["intent"], intent)
+                self.assertGreater(result["confidence"], 0.5)
+
     def test_intent_categories(self):
         """Test that intent categories are properly defined"""
         self.assertTrue(len(INTENT_CATEGORIES) > 0)
@@ -27,48 +54,6 @@ class TestIntentRecognition(unittest.TestCase):
             normalized = self.recognizer._normalize_query(original)
             self.assertEqual(normalized, expected)
     
-    def test_customer_info_intent(self):
-        """Test recognition of customer info intent"""
-        test_queries = [
-            "Show me information about customer ABC Corp",
-            "Get details for client XYZ Inc",
-            "Who is customer John Smith",
-            "Display customer information for Global Traders"
-        ]
-        
-        for query in test_queries:
-            result = self.recognizer.recognize_intent(query)
-            self.assertEqual(result["intent"], "get_customer_info")
-            self.assertGreater(result["confidence"], 0.5)
-    
-    def test_invoice_intent(self):
-        """Test recognition of invoice intent"""
-        test_queries = [
-            "Show me invoice INV-001",
-            "Check the status of invoice INV-2023-05",
-            "What's the status of bill #B12345",
-            "Find invoice number INV-2023-001"
-        ]
-        
-        for query in test_queries:
-            result = self.recognizer.recognize_intent(query)
-            self.assertEqual(result["intent"], "check_invoice")
-            self.assertGreater(result["confidence"], 0.5)
-    
-    def test_help_intent(self):
-        """Test recognition of help intent"""
-        test_queries = [
-            "Help me with creating an invoice",
-            "I need assistance with inventory management",
-            "Guide me on how to update customer information",
-            "Help with sales order process"
-        ]
-        
-        for query in test_queries:
-            result = self.recognizer.recognize_intent(query)
-            self.assertEqual(result["intent"], "help")
-            self.assertGreater(result["confidence"], 0.5)
-    
     def test_entity_extraction(self):
         """Test entity extraction from queries"""
         test_cases = [